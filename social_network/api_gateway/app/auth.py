@@ -1,12 +1,26 @@
+from collections import OrderedDict
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from fastapi import HTTPException, status
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import Awaitable, Callable, Optional
 import os
+import time
 
 # Настройки JWT
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ROLE_VERSION_TTL_SECONDS = float(os.getenv("ROLE_VERSION_TTL_SECONDS", "30"))
+
+# Права ролей (совпадают с user_service); роль user есть у всех и в токен не записывается
+ROLE_PERMISSIONS = {
+    "user": {"profile:read", "profile:write"},
+    "admin": {"roles:manage"},
+}
+DEFAULT_ROLE = "user"
+
+bearer = HTTPBearer()
 
 def create_jwt_token(data: dict, expires_delta: timedelta = None):
     """Создание JWT токена"""
@@ -20,8 +34,8 @@ def create_jwt_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_jwt_token(token: str):
-    """Проверка JWT токена"""
+def decode_jwt_token(token: str) -> dict:
+    """Проверка JWT токена; возвращает все claims"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -31,10 +45,92 @@ def verify_jwt_token(token: str):
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return username
+        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+def verify_jwt_token(token: str):
+    """Проверка JWT токена"""
+    return decode_jwt_token(token)["sub"]
+
+def permissions_for(roles) -> set[str]:
+    """Объединение прав роли user и перечисленных ролей"""
+    permissions = set(ROLE_PERMISSIONS[DEFAULT_ROLE])
+    for role in roles:
+        permissions |= ROLE_PERMISSIONS.get(role, set())
+    return permissions
+
+class RoleVersionCache:
+    """Версии ролей по id пользователя с TTL и LRU-ограничением; промах загружается через load(token)"""
+
+    def __init__(
+        self,
+        load: Callable[[str], Awaitable[Optional[int]]],
+        ttl_seconds: float = 30.0,
+        max_keys: int = 10000,
+    ):
+        self.load = load
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._versions: OrderedDict[int, tuple[int, float]] = OrderedDict()
+
+    async def get(self, user_id: int, token: str) -> Optional[int]:
+        cached = self._versions.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            self._versions.move_to_end(user_id)
+            return cached[0]
+        version = await self.load(token)
+        if version is not None:
+            self.set(user_id, version)
+        return version
+
+    def set(self, user_id: int, version: int):
+        self._versions[user_id] = (version, time.monotonic() + self.ttl_seconds)
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_keys:
+            self._versions.popitem(last=False)
+
+    def clear(self):
+        self._versions.clear()
+
+class Principal:
+    """Пользователь запроса по данным токена"""
+
+    def __init__(self, user_id: Optional[int], username: str, roles: list[str], role_version: int, token: str):
+        self.user_id = user_id
+        self.username = username
+        self.roles = roles
+        self.role_version = role_version
+        self.token = token
+        self.permissions = permissions_for(roles)
+
+def require_permission(permission: str, versions: RoleVersionCache):
+    """Зависимость FastAPI: проверка права по claims токена без обращения к user_service.
+
+    user_service вызывается только при промахе кэша версий ролей.
+    """
+    async def dependency(credentials: HTTPAuthorizationCredentials = Depends(bearer)) -> Principal:
+        claims = decode_jwt_token(credentials.credentials)
+        principal = Principal(
+            claims.get("uid"), claims["sub"], claims.get("roles", []), claims.get("rv", 0), credentials.credentials
+        )
+        if principal.user_id is not None:
+            current = await versions.get(principal.user_id, principal.token)
+            if current is None or principal.role_version < current:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token roles are outdated",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+        if permission not in principal.permissions:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Insufficient permissions"
+            )
+        return principal
+
+    return dependency
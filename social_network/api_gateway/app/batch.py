@@ -0,0 +1,118 @@
+from typing import Any, Awaitable, Callable
+import asyncio
+import re
+from fastapi import HTTPException, status
+from .schemas import BatchItem, BatchItemResponse
+
+TEMPLATE_RE = re.compile(r"\{\{\s*([A-Za-z0-9_\-]+)((?:\.[A-Za-z0-9_\-]+)*)\s*\}\}")
+
+Dispatch = Callable[[str, str, Any], Awaitable[tuple[Any, int]]]
+
+def template_refs(value: Any) -> set[str]:
+    """id запросов, на ответы которых ссылаются шаблоны {{id.body.field}}"""
+    if isinstance(value, str):
+        return {match.group(1) for match in TEMPLATE_RE.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*(template_refs(item) for item in value.values()))
+    if isinstance(value, list):
+        return set().union(*(template_refs(item) for item in value))
+    return set()
+
+def validate_batch(items: list[BatchItem]):
+    """Проверка уникальности id и того, что зависимости и шаблоны ссылаются на предыдущие запросы"""
+    seen = set()
+    for item in items:
+        if item.id in seen:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Duplicate request id: {item.id}"
+            )
+        for dependency in item.depends_on:
+            if dependency not in seen:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Request {item.id} depends on unknown or later request: {dependency}"
+                )
+        # Ответ запроса вне depends_on может быть еще не готов к моменту подстановки
+        missing = template_refs(item.path) | template_refs(item.body)
+        missing.difference_update(item.depends_on)
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Request {item.id} references requests not listed in depends_on: {', '.join(sorted(missing))}"
+            )
+        seen.add(item.id)
+
+def lookup(results: dict[str, BatchItemResponse], ref: str, path: str) -> Any:
+    value: Any = results[ref].model_dump()
+    for key in path.split(".")[1:]:
+        if isinstance(value, list) and key.isdigit():
+            value = value[int(key)]
+        elif isinstance(value, dict):
+            value = value[key]
+        else:
+            raise KeyError(key)
+    return value
+
+def render(value: Any, results: dict[str, BatchItemResponse]) -> Any:
+    """Подстановка {{id.body.field}} из ответов предыдущих запросов"""
+    if isinstance(value, str):
+        whole = TEMPLATE_RE.fullmatch(value)
+        if whole:
+            # Шаблон целиком сохраняет тип значения (число, объект)
+            return lookup(results, whole.group(1), whole.group(2))
+        return TEMPLATE_RE.sub(lambda m: str(lookup(results, m.group(1), m.group(2))), value)
+    if isinstance(value, dict):
+        return {key: render(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [render(item, results) for item in value]
+    return value
+
+async def run_batch(items: list[BatchItem], dispatch: Dispatch, timeout: float) -> list[BatchItemResponse]:
+    """Параллельное выполнение запросов пакета; запрос ждет только свои зависимости"""
+    results: dict[str, BatchItemResponse] = {}
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def run(item: BatchItem) -> BatchItemResponse:
+        if item.depends_on:
+            await asyncio.gather(*(tasks[dependency] for dependency in item.depends_on))
+            failed = [d for d in item.depends_on if results[d].status >= 400]
+            if failed:
+                return BatchItemResponse(
+                    id=item.id, status=status.HTTP_424_FAILED_DEPENDENCY,
+                    body={"detail": f"Dependency failed: {', '.join(failed)}"}
+                )
+        try:
+            path = str(render(item.path, results))
+            body = render(item.body, results)
+        except (KeyError, IndexError, TypeError):
+            return BatchItemResponse(
+                id=item.id, status=status.HTTP_400_BAD_REQUEST,
+                body={"detail": "Cannot resolve template"}
+            )
+        try:
+            data, status_code = await dispatch(item.method, path, body)
+        except HTTPException as e:
+            data, status_code = {"detail": e.detail}, e.status_code
+        except Exception:
+            data, status_code = {"detail": "Bad gateway"}, status.HTTP_502_BAD_GATEWAY
+        return BatchItemResponse(id=item.id, status=status_code, body=data)
+
+    async def run_and_store(item: BatchItem) -> BatchItemResponse:
+        results[item.id] = await run(item)
+        return results[item.id]
+
+    for item in items:
+        tasks[item.id] = asyncio.create_task(run_and_store(item))
+
+    _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    return [
+        results.get(item.id) or BatchItemResponse(
+            id=item.id, status=status.HTTP_504_GATEWAY_TIMEOUT,
+            body={"detail": "Batch deadline exceeded"}
+        )
+        for item in items
+    ]
@@ -0,0 +1,42 @@
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import httpx
+
+# Заголовки, которые проходят через gateway без изменений
+UPLOAD_HEADERS = ("content-type", "content-length")
+DOWNLOAD_REQUEST_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+DOWNLOAD_RESPONSE_HEADERS = (
+    "content-type", "content-length", "content-range", "accept-ranges",
+    "etag", "last-modified", "content-disposition", "content-security-policy",
+)
+# Ответ с файлом пользователя никогда не угадывает тип по содержимому, даже если storage_service не прислал заголовок
+DOWNLOAD_SECURITY_HEADERS = {"x-content-type-options": "nosniff"}
+
+def pick(headers, names) -> dict:
+    return {name: headers[name] for name in names if name in headers}
+
+async def stream_upload(client: httpx.AsyncClient, url: str, request: Request, headers: dict, timeout: httpx.Timeout):
+    """Загрузка без буферизации: тело запроса передается в storage_service по мере получения"""
+    response = await client.put(
+        url,
+        content=request.stream(),
+        headers={**pick(request.headers, UPLOAD_HEADERS), **headers},
+        timeout=timeout,
+    )
+    return response
+
+async def stream_download(client: httpx.AsyncClient, url: str, request: Request, headers: dict, timeout: httpx.Timeout):
+    """Скачивание потоком; Range и условные заголовки обрабатывает storage_service"""
+    upstream = await client.send(
+        client.build_request(
+            request.method, url, headers={**pick(request.headers, DOWNLOAD_REQUEST_HEADERS), **headers}, timeout=timeout
+        ),
+        stream=True,
+    )
+    return StreamingResponse(
+        upstream.aiter_raw(),
+        status_code=upstream.status_code,
+        headers={**pick(upstream.headers, DOWNLOAD_RESPONSE_HEADERS), **DOWNLOAD_SECURITY_HEADERS},
+        background=BackgroundTask(upstream.aclose),
+    )
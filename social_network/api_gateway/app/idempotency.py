@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from itertools import islice
+from fastapi import HTTPException
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import hashlib
+import json
+import time
+
+MAX_KEY_LENGTH = 255
+
+def scope_key(
+    key: str, method: str, endpoint: str, authorization: Optional[str], body_fingerprint: str = ""
+) -> str:
+    """Ключ с методом, маршрутом и владельцем токена: один Idempotency-Key не пересекается между клиентами.
+
+    Без токена владелец неизвестен, поэтому в ключ входит отпечаток тела: совпавшие ключи
+    разных анонимных клиентов не получают чужой ответ и не отклоняются как повтор с другим телом.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+    if authorization:
+        owner = hashlib.sha256(authorization.encode()).hexdigest()[:32]
+    else:
+        owner = f"anonymous:{body_fingerprint[:32]}"
+    return f"{method} {endpoint} {owner} {key}"
+
+def fingerprint(data: Any) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+class IdempotencyEntry:
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.task: Optional[asyncio.Task] = None
+        self.expires_at: Optional[float] = None
+
+class IdempotencyStore:
+    """Первый ответ на Idempotency-Key в памяти процесса с TTL и LRU-ограничением.
+
+    Повтор с тем же ключом получает сохраненный ответ, параллельный дубликат ждет
+    выполняющийся запрос. Ошибки (исключения и 5xx) не сохраняются, чтобы клиент мог повторить запрос.
+    """
+
+    def __init__(self, ttl_seconds: float = 86400, max_keys: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries: OrderedDict[str, IdempotencyEntry] = OrderedDict()
+
+    def _evict(self, now: float):
+        # Порядок - по последнему использованию, поэтому истекшие и лишние ключи в начале;
+        # просматривается только начало, выполняющиеся запросы (их ждут дубликаты) не вытесняются
+        overflow = max(len(self._entries) - self.max_keys, 0)
+        for key in list(islice(self._entries, overflow + 8)):
+            entry = self._entries[key]
+            if entry.expires_at is not None and (entry.expires_at <= now or len(self._entries) > self.max_keys):
+                del self._entries[key]
+
+    async def _run(self, key: str, entry: IdempotencyEntry, operation):
+        try:
+            result = await operation()
+        except BaseException:
+            self._entries.pop(key, None)
+            raise
+        if result[1] >= 500:
+            self._entries.pop(key, None)
+        else:
+            now = time.monotonic()
+            entry.expires_at = now + self.ttl_seconds
+            self._evict(now)
+        return result
+
+    async def execute(
+        self, key: str, request_fingerprint: str, operation: Callable[[], Awaitable[tuple[Any, int]]]
+    ) -> tuple[tuple[Any, int], bool]:
+        """Результат operation() и признак того, что он получен другим запросом с тем же ключом"""
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is not None:
+            if entry.fingerprint != request_fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+            self._entries.move_to_end(key)
+            return await asyncio.shield(entry.task), True
+
+        entry = IdempotencyEntry(request_fingerprint)
+        self._entries[key] = entry
+        # Запрос выполняется отдельной задачей: если клиент отключится, ответ все равно
+        # сохранится и достанется его повтору
+        entry.task = asyncio.ensure_future(self._run(key, entry, operation))
+        entry.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return await asyncio.shield(entry.task), False
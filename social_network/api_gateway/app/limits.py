@@ -0,0 +1,254 @@
+from collections import OrderedDict
+from typing import Optional
+import json
+import math
+import sqlite3
+import threading
+import time
+from starlette.concurrency import run_in_threadpool
+from .metrics import resolve_route
+
+def parse_rate(value: str) -> tuple[float, float]:
+    """Разбор лимита вида "rate:burst" (запросов в секунду и размер всплеска)"""
+    rate, _, burst = value.partition(":")
+    rate = float(rate)
+    return rate, float(burst) if burst else rate
+
+def parse_route_rates(value: str) -> dict[str, tuple[float, float]]:
+    """Разбор лимитов маршрутов вида "/login=200:400,/register=50" """
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            route, _, rate = item.strip().partition("=")
+            limits[route.strip()] = parse_rate(rate)
+    return limits
+
+class MemoryBucketStore:
+    """Token bucket'ы в памяти процесса с ограничением числа ключей (LRU)"""
+
+    # Списание не блокирует event loop, вызывается прямо в middleware
+    blocking = False
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        """Списание одного токена; возвращает 0 или сколько секунд ждать до следующего"""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+class SQLiteBucketStore:
+    """Token bucket'ы в общем SQLite-файле, чтобы лимиты действовали на все воркеры хоста.
+
+    Списание может ждать блокировку файла до timeout секунд, поэтому middleware вызывает его
+    в пуле потоков. Если файл так и остался заблокирован (или недоступен), при fail_open=True
+    запрос пропускается без лимита, иначе отклоняется с 429 и Retry-After: 1.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, fail_open: bool = True, timeout: float = 1.0):
+        self.path = path
+        self.fail_open = fail_open
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        try:
+            return self._take(key, rate, burst, now)
+        except sqlite3.Error:
+            return 0.0 if self.fail_open else 1.0
+
+    def _take(self, key: str, rate: float, burst: float, now: float) -> float:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if tokens >= 1:
+                tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+def make_bucket_store(path: Optional[str], fail_open: bool = True):
+    return SQLiteBucketStore(path, fail_open=fail_open) if path else MemoryBucketStore()
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD-лимит одновременных запросов к upstream: лимит растет на 1 за "окно"
+    быстрых ответов и умножается на backoff при ошибках или росте задержки.
+
+    Задержка без нагрузки оценивается по каждому маршруту отдельно: вход с bcrypt
+    в разы медленнее чтения профиля, и общая оценка считала бы каждый вход перегрузкой.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 2,
+        max_limit: int = 500,
+        backoff: float = 0.9,
+        tolerance: float = 2.0,
+        min_latency_threshold: float = 0.05,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.min_latency_threshold = min_latency_threshold
+        self.in_flight = 0
+        self.no_load_latency: dict[str, float] = {}
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float, ok: bool, route: str = ""):
+        self.in_flight -= 1
+        no_load_latency = self.no_load_latency.get(route)
+        if ok:
+            # Оценка задержки без нагрузки: быстро следует за минимумом и медленно растет,
+            # чтобы пережить изменение базовой задержки
+            if no_load_latency is None or latency < no_load_latency:
+                no_load_latency = latency
+            else:
+                no_load_latency += (latency - no_load_latency) * 0.001
+            self.no_load_latency[route] = no_load_latency
+        overloaded = not ok or (
+            no_load_latency is not None
+            and latency > self.min_latency_threshold
+            and latency > no_load_latency * self.tolerance
+        )
+        if overloaded:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def retry_after(self, route: str = "") -> int:
+        no_load_latency = self.no_load_latency.get(route)
+        if no_load_latency is None:
+            return 1
+        return max(1, math.ceil(no_load_latency * self.tolerance))
+
+class RateLimitMiddleware:
+    """ASGI middleware: token bucket на маршрут и на клиента, при превышении - 429 с Retry-After"""
+
+    def __init__(
+        self,
+        app,
+        store=None,
+        client_rate: Optional[tuple[float, float]] = None,
+        route_rates: Optional[dict[str, tuple[float, float]]] = None,
+        exempt_routes: tuple[str, ...] = ("/metrics",),
+    ):
+        self.app = app
+        self.store = store or MemoryBucketStore()
+        self.client_rate = client_rate
+        self.route_rates = route_rates or {}
+        self.exempt_routes = exempt_routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (self.client_rate is None and not self.route_rates):
+            await self.app(scope, receive, send)
+            return
+
+        route = resolve_route(scope)
+        if route in self.exempt_routes:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        client_id = client[0] if client else "unknown"
+        if self.store.blocking:
+            wait = await run_in_threadpool(self.take, route, client_id, time.time())
+        else:
+            wait = self.take(route, client_id, time.time())
+
+        if wait:
+            await reject(send, 429, "Too many requests", math.ceil(wait))
+            return
+        await self.app(scope, receive, send)
+
+    def take(self, route: str, client_id: str, now: float) -> float:
+        """Списание из bucket'ов маршрута и клиента; 0 или сколько секунд ждать"""
+        return take_tokens(self.store, self.route_rates, self.client_rate, route, client_id, now)
+
+def take_tokens(
+    store,
+    route_rates: dict[str, tuple[float, float]],
+    client_rate: Optional[tuple[float, float]],
+    route: str,
+    client_id: str,
+    now: float
+) -> float:
+    """Списание сначала из bucket'а маршрута, затем клиента; 0 или сколько секунд ждать"""
+    wait = 0.0
+    route_rate = route_rates.get(route)
+    if route_rate is not None:
+        wait = store.take(f"route:{route}", *route_rate, now)
+    if not wait and client_rate is not None:
+        wait = store.take(f"client:{client_id}", *client_rate, now)
+    return wait
+
+async def take_request_tokens(
+    store,
+    route_rates: dict[str, tuple[float, float]],
+    client_rate: Optional[tuple[float, float]],
+    route: str,
+    client_id: str
+) -> float:
+    """Списание токенов маршрута и клиента вне middleware (для запросов внутри /batch)"""
+    if store.blocking:
+        return await run_in_threadpool(take_tokens, store, route_rates, client_rate, route, client_id, time.time())
+    return take_tokens(store, route_rates, client_rate, route, client_id, time.time())
+
+async def reject(send, status_code: int, detail: str, retry_after: int):
+    """Быстрый отказ без обращения к приложению"""
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(retry_after).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -1,17 +1,122 @@
+import asyncio
 import httpx
-from fastapi import FastAPI, HTTPException, status, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Request, Response, status, Depends
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import ValidationError
+from typing import Optional
+from urllib.parse import quote
 from .schemas import (
     RegisterRequest, LoginRequest, ProfileUpdateRequest, 
-    TokenResponse, UserResponse, MessageResponse
+    TokenResponse, UserResponse, MessageResponse, BatchRequest, BatchResponse,
+    RolesUpdateRequest, UserRolesResponse, FileUploadResponse
 )
+from .auth import Principal, RoleVersionCache, require_permission, verify_jwt_token, ROLE_VERSION_TTL_SECONDS
+from .files import stream_upload, stream_download
+from .batch import validate_batch, run_batch
+from .protocol import (
+    ClientAddressMiddleware, PrimaryUntilMiddleware, request_options, decode_response, remember_primary_until
+)
+from .tracing import TracingMiddleware, start_span, inject_headers
+from .metrics import MetricsMiddleware, UPSTREAM_DURATION, metrics_response
+from .upstreams import UpstreamPool, CONNECT_ERRORS
+from .idempotency import IdempotencyStore, scope_key, fingerprint
+from .limits import (
+    AdaptiveConcurrencyLimiter, RateLimitMiddleware, make_bucket_store, parse_rate, parse_route_rates,
+    take_request_tokens
+)
+import math
 import os
+import time
+
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service:8001")
+# Несколько экземпляров user_service через запятую; по умолчанию - один USER_SERVICE_URL
+USER_SERVICE_URLS = [
+    url.strip() for url in os.getenv("USER_SERVICE_URLS", USER_SERVICE_URL).split(",") if url.strip()
+]
+UPSTREAM_HEALTH_INTERVAL = float(os.getenv("UPSTREAM_HEALTH_INTERVAL", "5"))
+UPSTREAM_HEDGE_DELAY_MS = os.getenv("UPSTREAM_HEDGE_DELAY_MS")
+STORAGE_SERVICE_URL = os.getenv("STORAGE_SERVICE_URL", "http://storage_service:8003")
+# Общий секрет с storage_service, передается в X-Internal-Token (тот же STORAGE_INTERNAL_TOKEN в обоих сервисах)
+STORAGE_INTERNAL_TOKEN = os.getenv("STORAGE_INTERNAL_TOKEN")
+# Бакеты, файлы из которых отдаются без токена (аватары); остальные скачиваются только с JWT
+PUBLIC_BUCKETS = {b.strip() for b in os.getenv("PUBLIC_BUCKETS", "avatars").split(",") if b.strip()}
+# Наибольшее окно чтений из primary после записи: X-Primary-Until дальше now + окно обрезается
+PRIMARY_STICKINESS_SECONDS = float(os.getenv("PRIMARY_STICKINESS_SECONDS", "5"))
+# Таймаут на каждую операцию чтения/записи при передаче файлов (не на весь файл)
+STORAGE_TIMEOUT = float(os.getenv("STORAGE_TIMEOUT", "60"))
+# Формат тела запросов gateway -> user_service: json или msgpack. msgpack включается явно,
+# когда все экземпляры user_service уже принимают его: старый экземпляр ответит 422 на такое тело
+INTERNAL_PROTOCOL = os.getenv("INTERNAL_PROTOCOL", "json")
+
+user_service = UpstreamPool(
+    USER_SERVICE_URLS,
+    max_failures=int(os.getenv("UPSTREAM_MAX_FAILURES", "3")),
+    ejection_seconds=float(os.getenv("UPSTREAM_EJECTION_SECONDS", "30")),
+    hedge_delay=float(UPSTREAM_HEDGE_DELAY_MS) / 1000 if UPSTREAM_HEDGE_DELAY_MS else None,
+)
+http_client = None
+
+# Ответы на запросы с Idempotency-Key; повторы записи при ошибках соединения
+idempotency_store = IdempotencyStore(
+    ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+    max_keys=int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000")),
+)
+WRITE_RETRIES = int(os.getenv("WRITE_RETRIES", "2"))
+
+# Лимиты запросов: "rate:burst" в запросах в секунду; пустое значение отключает лимит
+RATE_LIMIT_PER_CLIENT = os.getenv("RATE_LIMIT_PER_CLIENT", "50:100")
+RATE_LIMIT_ROUTES = os.getenv("RATE_LIMIT_ROUTES", "")
+# Общий SQLite-файл для token bucket'ов всех воркеров; по умолчанию - память процесса
+LIMITS_STORE_PATH = os.getenv("LIMITS_STORE_PATH")
+# Если общий файл лимитов заблокирован дольше таймаута: пропускать запрос (true) или отвечать 429
+LIMITS_FAIL_OPEN = os.getenv("LIMITS_FAIL_OPEN", "true").lower() in ("1", "true", "yes")
+bucket_store = make_bucket_store(LIMITS_STORE_PATH, fail_open=LIMITS_FAIL_OPEN)
+route_rates = parse_route_rates(RATE_LIMIT_ROUTES)
+client_rate = parse_rate(RATE_LIMIT_PER_CLIENT) if RATE_LIMIT_PER_CLIENT else None
+concurrency_limiter = AdaptiveConcurrencyLimiter(
+    initial_limit=int(os.getenv("UPSTREAM_CONCURRENCY_INITIAL", "20")),
+    max_limit=int(os.getenv("UPSTREAM_CONCURRENCY_MAX", "500")),
+)
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий клиент с пулом keep-alive соединений к сервисам"""
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=2.0),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+        )
+    return http_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    health_checks = None
+    if len(user_service.upstreams) > 1:
+        health_checks = asyncio.create_task(
+            user_service.run_health_checks(get_http_client(), UPSTREAM_HEALTH_INTERVAL)
+        )
+    yield
+    if health_checks is not None:
+        health_checks.cancel()
+    if http_client is not None:
+        await http_client.aclose()
 
 app = FastAPI(
     title="API Gateway",
     description="API Gateway для проксирования запросов к сервису пользователей",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Ограничение частоты запросов (внутри CORS, чтобы 429 тоже содержали CORS-заголовки)
+app.add_middleware(
+    RateLimitMiddleware,
+    store=bucket_store,
+    client_rate=client_rate,
+    route_rates=route_rates,
 )
 
 # Настройка CORS
@@ -22,34 +127,113 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service:8001")
+app.add_middleware(ClientAddressMiddleware)
+app.add_middleware(PrimaryUntilMiddleware, max_window=PRIMARY_STICKINESS_SECONDS)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-async def proxy_request(method: str, endpoint: str, data: dict = None, headers: dict = None):
-    """Проксирование запроса к сервису пользователей"""
-    url = f"{USER_SERVICE_URL}/api/v1{endpoint}"
+# Маршруты gateway, доступные внутри /batch, и модели проверки тела запроса
+BATCH_ROUTES = {
+    ("POST", "/register"): RegisterRequest,
+    ("POST", "/login"): LoginRequest,
+    ("GET", "/profile"): None,
+    ("PUT", "/profile"): ProfileUpdateRequest,
+    ("GET", "/users"): None,
+}
+
+async def proxy_request(
+    method: str, endpoint: str, data: dict = None, headers: dict = None, route: Optional[str] = None
+):
+    """Проксирование запроса к сервису пользователей.
+
+    route - шаблон пути для меток метрик и трейсов, если endpoint содержит параметры
+    (например /admin/users/{username}/roles), чтобы не заводить отдельный ряд на каждое значение.
+    """
+    method = method.upper()
+    route = route or endpoint
+    if method not in ("GET", "POST", "PUT"):
+        raise HTTPException(status_code=405, detail="Method not allowed")
+    path = f"/api/v1{endpoint}"
+    # Сброс нагрузки: при превышении адаптивного лимита отвечаем сразу, не создавая очередь
+    if not concurrency_limiter.try_acquire():
+        raise HTTPException(
+            status_code=503,
+            detail="Service overloaded",
+            headers={"Retry-After": str(concurrency_limiter.retry_after(route))}
+        )
     
-    async with httpx.AsyncClient() as client:
-        try:
-            if method.upper() == "GET":
-                response = await client.get(url, headers=headers)
-            elif method.upper() == "POST":
-                response = await client.post(url, json=data, headers=headers)
-            elif method.upper() == "PUT":
-                response = await client.put(url, json=data, headers=headers)
-            else:
-                raise HTTPException(status_code=405, detail="Method not allowed")
-            
-            return response.json(), response.status_code
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+    # Запись повторяется только с Idempotency-Key: при ошибке соединения - любая,
+    # после отправки - только PUT, повтор которого не меняет результат
+    retry_on = ()
+    if method != "GET" and headers and "Idempotency-Key" in headers:
+        retry_on = httpx.TransportError if method == "PUT" else CONNECT_ERRORS
+
+    start = time.perf_counter()
+    status_class = "error"
+    try:
+        with start_span("proxy", **{"http.method": method, "http.route": f"/api/v1{route}"}) as span:
+            headers = inject_headers(headers)
+            response = await user_service.request(
+                get_http_client(), method, path,
+                hedge=method == "GET",
+                retries=WRITE_RETRIES if retry_on else 0,
+                retry_on=retry_on,
+                route=f"/api/v1{route}",
+                **request_options(INTERNAL_PROTOCOL, data if method != "GET" else None, headers)
+            )
+            status_class = f"{response.status_code // 100}xx"
+            remember_primary_until(response)
+            if span is not None:
+                span.attributes["http.status_code"] = response.status_code
+        
+        with start_span("deserialize"):
+            return decode_response(response), response.status_code
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+    finally:
+        latency = time.perf_counter() - start
+        concurrency_limiter.release(latency, ok=status_class not in ("error", "5xx"), route=route)
+        UPSTREAM_DURATION.labels(method, route, status_class).observe(latency)
+
+async def load_role_version(token: str) -> Optional[int]:
+    """Текущая версия ролей владельца токена из user_service (при промахе кэша)"""
+    data, status_code = await proxy_request("GET", "/roles/version", None, {"Authorization": f"Bearer {token}"})
+    return data["roles_version"] if status_code == 200 else None
+
+role_versions = RoleVersionCache(load_role_version, ttl_seconds=ROLE_VERSION_TTL_SECONDS)
+
+async def idempotent_proxy_request(
+    idempotency_key: Optional[str], response: Response,
+    method: str, endpoint: str, data: dict = None, headers: dict = None
+):
+    """proxy_request с Idempotency-Key: повтор получает первый ответ, параллельный дубликат ждет его"""
+    if idempotency_key is None:
+        return await proxy_request(method, endpoint, data, headers)
+    authorization = headers.get("Authorization") if headers else None
+    body_fingerprint = fingerprint(data)
+    key = scope_key(idempotency_key, method, endpoint, authorization, body_fingerprint)
+    headers = {**(headers or {}), "Idempotency-Key": idempotency_key}
+    result, replayed = await idempotency_store.execute(
+        key, body_fingerprint, lambda: proxy_request(method, endpoint, data, headers)
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 @app.post("/register", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
-async def register(request: RegisterRequest):
+async def register(
+    request: RegisterRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None)
+):
     """Регистрация нового пользователя"""
     import httpx
     try:
-        data, status_code = await proxy_request("POST", "/register", request.model_dump(mode='json'), None)
+        data, status_code = await idempotent_proxy_request(
+            idempotency_key, response, "POST", "/register", request.model_dump(mode='json'), None
+        )
     except httpx.RequestError as e:
         raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
     
@@ -90,14 +274,16 @@ async def get_profile(credentials: HTTPAuthorizationCredentials = Depends(securi
 @app.put("/profile", response_model=UserResponse)
 async def update_profile(
     request: ProfileUpdateRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """Обновление профиля пользователя"""
     import httpx
     headers = {"Authorization": f"Bearer {credentials.credentials}"}
     payload = request.model_dump(mode='json', exclude_unset=True, exclude_none=True)
     try:
-        data, status_code = await proxy_request("PUT", "/profile", payload, headers)
+        data, status_code = await idempotent_proxy_request(idempotency_key, response, "PUT", "/profile", payload, headers)
     except httpx.RequestError as e:
         raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
     
@@ -120,6 +306,124 @@ async def get_users():
     
     return [UserResponse(**user) for user in data]
 
+@app.put("/admin/users/{username}/roles", response_model=UserRolesResponse)
+async def update_roles(
+    username: str,
+    request: RolesUpdateRequest,
+    principal: Principal = Depends(require_permission("roles:manage", role_versions))
+):
+    """Замена ролей пользователя (право roles:manage проверяется по токену до обращения к сервису)"""
+    headers = {"Authorization": f"Bearer {principal.token}"}
+    data, status_code = await proxy_request(
+        "PUT", f"/admin/users/{quote(username, safe='')}/roles", request.model_dump(), headers,
+        route="/admin/users/{username}/roles"
+    )
+
+    if status_code != 200:
+        raise HTTPException(status_code=status_code, detail=data.get("detail", "Failed to update roles"))
+
+    # Старые токены пользователя отклоняются gateway сразу, не дожидаясь истечения TTL кэша
+    role_versions.set(data["id"], data["roles_version"])
+    return UserRolesResponse(**data)
+
+def storage_headers() -> dict:
+    return {"X-Internal-Token": STORAGE_INTERNAL_TOKEN} if STORAGE_INTERNAL_TOKEN else {}
+
+@app.put("/files/{bucket}/{filename}", response_model=FileUploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_file(
+    bucket: str,
+    filename: str,
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Потоковая загрузка файла в каталог текущего пользователя (тело запроса - содержимое файла)"""
+    username = verify_jwt_token(credentials.credentials)
+    key = f"{username}/{filename}"
+    try:
+        response = await stream_upload(
+            get_http_client(),
+            f"{STORAGE_SERVICE_URL}/api/v1/objects/{bucket}/{key}",
+            request,
+            inject_headers(storage_headers()),
+            httpx.Timeout(STORAGE_TIMEOUT, connect=2.0)
+        )
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+
+    if response.status_code != 201:
+        # Ошибка может прийти не от storage_service (прокси, балансировщик) и без JSON
+        detail = "Upload failed"
+        if response.headers.get("content-type", "").startswith("application/json"):
+            detail = response.json().get("detail", detail)
+        status_code = response.status_code if response.status_code < 500 else status.HTTP_502_BAD_GATEWAY
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    return FileUploadResponse(**response.json(), url=f"/files/{bucket}/{key}")
+
+@app.api_route("/files/{bucket}/{key:path}", methods=["GET", "HEAD"])
+async def download_file(
+    bucket: str,
+    key: str,
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Скачивание файла потоком с поддержкой Range"""
+    if bucket not in PUBLIC_BUCKETS:
+        if credentials is None:
+            raise HTTPException(status_code=403, detail="Not authenticated")
+        verify_jwt_token(credentials.credentials)
+    try:
+        return await stream_download(
+            get_http_client(),
+            f"{STORAGE_SERVICE_URL}/api/v1/objects/{bucket}/{key}",
+            request,
+            inject_headers(storage_headers()),
+            httpx.Timeout(STORAGE_TIMEOUT, connect=2.0)
+        )
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+
+@app.post("/batch", response_model=BatchResponse)
+async def batch(
+    request: BatchRequest,
+    http_request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Пакетное выполнение нескольких запросов за одно обращение"""
+    # Ключ на весь пакет не защищает отдельные записи от повтора, поэтому явно не поддерживается
+    if idempotency_key is not None:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is not supported for /batch")
+    validate_batch(request.requests)
+    headers = {"Authorization": f"Bearer {credentials.credentials}"} if credentials else None
+    client_id = http_request.client.host if http_request.client else "unknown"
+
+    async def dispatch(method: str, path: str, body: Optional[dict]):
+        if (method, path) not in BATCH_ROUTES:
+            raise HTTPException(status_code=404, detail="Route is not available in batch")
+        # Те же лимиты (маршрута и клиента) и проверки тела, что и у отдельного запроса к этому маршруту
+        wait = await take_request_tokens(bucket_store, route_rates, client_rate, path, client_id)
+        if wait:
+            raise HTTPException(
+                status_code=429, detail="Too many requests", headers={"Retry-After": str(math.ceil(wait))}
+            )
+        model = BATCH_ROUTES[(method, path)]
+        if model is None:
+            return await proxy_request(method, path, None, headers)
+        try:
+            payload = model.model_validate(body or {}).model_dump(mode='json', exclude_unset=True, exclude_none=True)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=jsonable_encoder(e.errors(include_url=False)))
+        return await proxy_request(method, path, payload, headers)
+
+    responses = await run_batch(request.requests, dispatch, request.timeout_ms / 1000)
+    return BatchResponse(responses=responses)
+
 @app.get("/")
 async def root():
-    return {"message": "API Gateway", "version": "1.0.0"}
\ No newline at end of file
+    return {"message": "API Gateway", "version": "1.0.0"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    return metrics_response()
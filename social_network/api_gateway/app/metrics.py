@@ -0,0 +1,78 @@
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+)
+from prometheus_client import multiprocess
+from starlette.responses import Response
+from starlette.routing import Match
+import os
+import time
+
+# При PROMETHEUS_MULTIPROC_DIR prometheus_client пишет значения в mmap-файлы,
+# и /metrics любого воркера отдает сумму по всем процессам
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUESTS_TOTAL = Counter(
+    "http_requests_total", "HTTP requests", ["method", "route", "status_class"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests in progress", ["method", "route"],
+    multiprocess_mode="livesum"
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"]
+)
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Latency of calls to upstream services",
+    ["method", "endpoint", "status_class"]
+)
+
+def resolve_route(scope) -> str:
+    """Шаблон пути маршрута (например /profile) вместо сырого пути, чтобы не раздувать метки"""
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+def metrics_response() -> Response:
+    """Ответ для /metrics в текстовом формате Prometheus"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+class MetricsMiddleware:
+    """ASGI middleware: счетчик, in-flight и гистограмма задержки по маршрутам"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = resolve_route(scope)
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_DURATION.labels(method, route).observe(time.perf_counter() - start)
+            REQUESTS_TOTAL.labels(method, route, f"{status_code // 100}xx").inc()
+            in_flight.dec()
@@ -0,0 +1,120 @@
+from contextvars import ContextVar
+from http.cookies import CookieError, SimpleCookie
+from typing import Any, Optional
+import math
+import time
+import httpx
+import msgpack
+
+# Внутренний формат обмена с user_service; внешние клиенты gateway работают с JSON
+MSGPACK = "application/x-msgpack"
+
+# Адрес клиента текущего запроса; user_service ограничивает по нему попытки входа
+_client_address: ContextVar[Optional[str]] = ContextVar("client_address", default=None)
+
+class ClientAddressMiddleware:
+    """Запоминает адрес клиента, чтобы передать его в X-Forwarded-For при проксировании"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        token = _client_address.set(client[0] if client else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _client_address.reset(token)
+
+# Read-your-writes: user_service после записи возвращает X-Primary-Until (unix-время, до которого
+# чтения клиента идут в primary). Gateway отдает его клиенту в cookie и заголовке и передает
+# в следующих запросах, поэтому отметка действует на любом воркере и экземпляре обоих сервисов
+PRIMARY_UNTIL_HEADER = "X-Primary-Until"
+PRIMARY_UNTIL_COOKIE = "primary_until"
+_primary_until: ContextVar[Optional[dict]] = ContextVar("primary_until", default=None)
+
+def parse_primary_until(value: Optional[str], max_window: float) -> float:
+    """Отметка не дальше now + max_window: значение от клиента не может закрепить его за primary надолго"""
+    try:
+        until = float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+    if not math.isfinite(until):
+        return 0.0
+    return min(until, time.time() + max_window)
+
+class PrimaryUntilMiddleware:
+    """Принимает отметку X-Primary-Until из cookie или заголовка и возвращает клиенту новую"""
+
+    def __init__(self, app, max_window: float = 5.0):
+        self.app = app
+        self.max_window = max_window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        value = headers.get(PRIMARY_UNTIL_HEADER.lower().encode(), b"").decode("latin-1")
+        if not value:
+            try:
+                cookie = SimpleCookie(headers.get(b"cookie", b"").decode("latin-1"))
+            except CookieError:
+                cookie = {}
+            if PRIMARY_UNTIL_COOKIE in cookie:
+                value = cookie[PRIMARY_UNTIL_COOKIE].value
+        state = {"until": parse_primary_until(value, self.max_window), "max_window": self.max_window, "updated": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state["updated"]:
+                until = f"{state['until']:.3f}"
+                max_age = max(math.ceil(state["until"] - time.time()), 0)
+                cookie = f"{PRIMARY_UNTIL_COOKIE}={until}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [
+                    *message.get("headers", []),
+                    (PRIMARY_UNTIL_HEADER.lower().encode(), until.encode()),
+                    (b"set-cookie", cookie.encode()),
+                ]}
+            await send(message)
+
+        token = _primary_until.set(state)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _primary_until.reset(token)
+
+def remember_primary_until(response: httpx.Response):
+    """Сохраняет отметку из ответа user_service для клиента и следующих запросов (например, в /batch)"""
+    state = _primary_until.get()
+    if state is None:
+        return
+    until = parse_primary_until(response.headers.get(PRIMARY_UNTIL_HEADER), state["max_window"])
+    if until > state["until"]:
+        state["until"] = until
+        state["updated"] = True
+
+def request_options(protocol: str, data: Any, headers: Optional[dict]) -> dict:
+    """Аргументы httpx-запроса: тело и заголовки в выбранном внутреннем формате"""
+    headers = dict(headers) if headers else {}
+    client_address = _client_address.get()
+    if client_address:
+        headers["X-Forwarded-For"] = client_address
+    primary_until = _primary_until.get()
+    if primary_until is not None and primary_until["until"] > time.time():
+        headers[PRIMARY_UNTIL_HEADER] = f"{primary_until['until']:.3f}"
+    if protocol != "msgpack":
+        return {"json": data, "headers": headers}
+    headers["Accept"] = f"{MSGPACK}, application/json"
+    if data is None:
+        return {"headers": headers}
+    headers["Content-Type"] = MSGPACK
+    return {"content": msgpack.packb(data), "headers": headers}
+
+def decode_response(response: httpx.Response) -> Any:
+    """Разбор ответа по его Content-Type (ошибки user_service всегда приходят в JSON)"""
+    if response.headers.get("content-type", "").startswith(MSGPACK):
+        return msgpack.unpackb(response.content)
+    return response.json()
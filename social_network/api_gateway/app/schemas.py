@@ -1,9 +1,11 @@
-from pydantic import BaseModel, EmailStr, constr, Field
-from typing import Optional
+from pydantic import BaseModel, EmailStr, constr, conint, Field
+from typing import Any, Literal, Optional
 from datetime import date, datetime
 
 class RegisterRequest(BaseModel):
-    username: constr(min_length=3, max_length=50) = Field(..., description="Username (3-50 characters)")
+    username: constr(min_length=3, max_length=50, pattern=r"^[^@]+$") = Field(
+        ..., description="Username (3-50 characters, without '@')"
+    )
     password: constr(min_length=8, max_length=100) = Field(..., description="Password (8-100 characters)")
     email: EmailStr = Field(..., description="Valid email address")
 
@@ -37,4 +39,41 @@ class TokenResponse(BaseModel):
     user: UserResponse
 
 class MessageResponse(BaseModel):
-    message: str
\ No newline at end of file
+    message: str
+
+class RolesUpdateRequest(BaseModel):
+    roles: list[str] = Field(..., description="Roles to keep; user role is implicit")
+
+class UserRolesResponse(BaseModel):
+    id: int
+    username: str
+    roles: list[str]
+    roles_version: int
+
+class FileUploadResponse(BaseModel):
+    bucket: str
+    key: str
+    size: int
+    sha256: str
+    content_type: str
+    deduplicated: bool = False
+    url: str
+
+class BatchItem(BaseModel):
+    id: constr(min_length=1, max_length=50, pattern=r"^[A-Za-z0-9_\-]+$") = Field(..., description="Request id, referenced as {{id.body.field}}")
+    method: Literal["GET", "POST", "PUT"] = Field("GET", description="HTTP method")
+    path: constr(min_length=1, max_length=200) = Field(..., description="Gateway path, e.g. /profile")
+    body: Optional[dict[str, Any]] = Field(None, description="JSON body for POST/PUT")
+    depends_on: list[str] = Field(default_factory=list, description="Ids of earlier requests to wait for")
+
+class BatchRequest(BaseModel):
+    requests: list[BatchItem] = Field(..., min_length=1, max_length=20, description="Sub-requests")
+    timeout_ms: conint(ge=1, le=30000) = Field(5000, description="Deadline for the whole batch")
+
+class BatchItemResponse(BaseModel):
+    id: str
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    responses: list[BatchItemResponse]
@@ -0,0 +1,212 @@
+from contextvars import ContextVar
+from contextlib import contextmanager
+from typing import Optional
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+
+# Настройки трассировки
+SERVICE_NAME = os.getenv("SERVICE_NAME", "api_gateway")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+# Span'ы сверх этого числа, ожидающие записи, отбрасываются, чтобы медленный диск не рос в памяти
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class Span:
+    """Span в формате W3C Trace Context"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled", "start", "attributes")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.start = time.time_ns()
+        self.attributes = {}
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class SpanExporter:
+    """Запись span'ов в фоновом потоке: обработчик только кладет запись в очередь и не ждет диска"""
+
+    def __init__(self, max_queue: int = TRACE_QUEUE_SIZE):
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, record: dict):
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Ожидание записи всех поставленных в очередь span'ов"""
+        if self._thread is not None:
+            self.queue.join()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            records = [self.queue.get()]
+            # Все накопившиеся записи пишутся одним вызовом write
+            while True:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+            except Exception:
+                pass
+            finally:
+                for _ in records:
+                    self.queue.task_done()
+
+    def _write(self, lines: str):
+        if TRACE_EXPORT_FILE:
+            with open(TRACE_EXPORT_FILE, "a", encoding="utf-8") as f:
+                f.write(lines)
+        else:
+            sys.stdout.write(lines)
+            sys.stdout.flush()
+
+span_exporter = SpanExporter()
+atexit.register(span_exporter.flush)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple[str, str, bool]]:
+    """Разбор заголовка traceparent: (trace_id, parent_span_id, sampled)"""
+    if not header:
+        return None
+    match = TRACEPARENT_RE.match(header.strip().lower())
+    if not match:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+def export_span(span: Span, end: int, error: Optional[BaseException] = None):
+    """Span одной JSON-строкой в формате, совместимом с OTLP/JSON; запись - в фоновом потоке"""
+    record = {
+        "resource": {"service.name": SERVICE_NAME},
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "parentSpanId": span.parent_id or "",
+        "name": span.name,
+        "startTimeUnixNano": str(span.start),
+        "endTimeUnixNano": str(end),
+        "durationMs": round((end - span.start) / 1e6, 3),
+        "attributes": [
+            {"key": key, "value": {"stringValue": str(value)}}
+            for key, value in span.attributes.items()
+        ],
+        "status": {"code": 2, "message": repr(error)} if error else {"code": 1},
+    }
+    span_exporter.submit(record)
+
+@contextmanager
+def start_span(name: str, **attributes):
+    """Дочерний span текущего запроса; без активного сэмплированного трейса ничего не делает"""
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        yield None
+        return
+    span = Span(parent.trace_id, parent.span_id, name, True)
+    span.attributes.update(attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        export_span(span, time.time_ns(), e)
+        raise
+    else:
+        export_span(span, time.time_ns())
+    finally:
+        _current_span.reset(token)
+
+def inject_headers(headers: Optional[dict] = None) -> Optional[dict]:
+    """Добавление traceparent текущего span в заголовки исходящего запроса"""
+    span = _current_span.get()
+    if span is None:
+        return headers
+    headers = dict(headers) if headers else {}
+    headers["traceparent"] = span.traceparent()
+    return headers
+
+class TracingMiddleware:
+    """ASGI middleware: продолжает трейс из traceparent или начинает новый с вероятностью TRACE_SAMPLE_RATE"""
+
+    def __init__(self, app, sample_rate: Optional[float] = None):
+        self.app = app
+        self.sample_rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                incoming = parse_traceparent(value.decode("latin-1"))
+                break
+
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            trace_id, parent_id, sampled = "%032x" % random.getrandbits(128), None, True
+        else:
+            # Быстрый путь: трассировка выключена, накладные расходы - одна проверка
+            await self.app(scope, receive, send)
+            return
+
+        span = Span(trace_id, parent_id, f"{scope['method']} {scope['path']}", sampled)
+        token = _current_span.set(span)
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"traceresponse", span.traceparent().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            if sampled:
+                export_span(span, time.time_ns(), e)
+            raise
+        else:
+            if sampled:
+                span.attributes["http.status_code"] = status_code
+                export_span(span, time.time_ns())
+        finally:
+            _current_span.reset(token)
@@ -0,0 +1,172 @@
+from typing import Optional
+import asyncio
+import random
+import statistics
+import time
+import httpx
+
+# Пауза перед повтором запроса, удваивается с каждой попыткой
+RETRY_BACKOFF = 0.05
+
+# Ошибки до отправки запроса: повтор безопасен для любого метода
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class Upstream:
+    """Экземпляр сервиса и его текущее состояние с точки зрения балансировщика"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        # EWMA задержки по шаблону маршрута: /login с bcrypt на порядок медленнее /profile,
+        # и общая оценка превращала бы долю входов в выбросы
+        self.latency_ewma: dict[str, float] = {}
+        self.ejected_until = 0.0
+        self.healthy = True
+
+    def available(self, now: float) -> bool:
+        return self.healthy and self.ejected_until <= now
+
+    def __repr__(self):
+        return f"Upstream({self.url!r})"
+
+class UpstreamPool:
+    """Клиентская балансировка: power of two choices по числу незавершенных запросов,
+    активные health check'и и исключение экземпляров с ошибками или высокой задержкой"""
+
+    def __init__(
+        self,
+        urls: list[str],
+        max_failures: int = 3,
+        ejection_seconds: float = 30.0,
+        latency_factor: float = 3.0,
+        min_outlier_latency: float = 0.05,
+        hedge_delay: Optional[float] = None,
+        ewma_alpha: float = 0.3,
+    ):
+        if not urls:
+            raise ValueError("At least one upstream URL is required")
+        self.upstreams = [Upstream(url) for url in urls]
+        self.max_failures = max_failures
+        self.ejection_seconds = ejection_seconds
+        self.latency_factor = latency_factor
+        self.min_outlier_latency = min_outlier_latency
+        self.hedge_delay = hedge_delay
+        self.ewma_alpha = ewma_alpha
+
+    def pick(self, exclude: Optional[Upstream] = None, route: Optional[str] = None) -> Upstream:
+        now = time.monotonic()
+        candidates = [u for u in self.upstreams if u is not exclude and u.available(now)]
+        if not candidates:
+            # Все экземпляры исключены: лучше попробовать любой, чем отказать сразу
+            candidates = [u for u in self.upstreams if u is not exclude] or self.upstreams
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return min(first, second, key=lambda u: (u.outstanding, u.latency_ewma.get(route, 0.0)))
+
+    def eject(self, upstream: Upstream):
+        upstream.ejected_until = time.monotonic() + self.ejection_seconds
+
+    def record(self, upstream: Upstream, latency: float, ok: bool, route: str = ""):
+        """Учет результата запроса; задержка сравнивается с другими экземплярами на том же маршруте"""
+        if not ok:
+            upstream.consecutive_failures += 1
+            if upstream.consecutive_failures >= self.max_failures:
+                self.eject(upstream)
+            return
+        upstream.consecutive_failures = 0
+        ewma = upstream.latency_ewma.get(route)
+        ewma = latency if ewma is None else ewma + self.ewma_alpha * (latency - ewma)
+        upstream.latency_ewma[route] = ewma
+        others = [
+            u.latency_ewma[route] for u in self.upstreams
+            if u is not upstream and route in u.latency_ewma
+        ]
+        if (
+            others
+            and ewma > self.min_outlier_latency
+            and ewma > self.latency_factor * statistics.median(others)
+        ):
+            self.eject(upstream)
+            # После возврата экземпляр оценивается заново
+            upstream.latency_ewma.clear()
+
+    async def send(
+        self, client: httpx.AsyncClient, method: str, path: str,
+        upstream: Optional[Upstream] = None, route: Optional[str] = None, **kwargs
+    ) -> httpx.Response:
+        route = route or path
+        upstream = upstream or self.pick(route=route)
+        upstream.outstanding += 1
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, f"{upstream.url}{path}", **kwargs)
+        except httpx.RequestError:
+            self.record(upstream, time.perf_counter() - start, ok=False, route=route)
+            raise
+        finally:
+            upstream.outstanding -= 1
+        self.record(upstream, time.perf_counter() - start, ok=response.status_code < 500, route=route)
+        return response
+
+    async def request(
+        self, client: httpx.AsyncClient, method: str, path: str, hedge: bool = False,
+        retries: int = 0, retry_on: tuple = (), route: Optional[str] = None, **kwargs
+    ) -> httpx.Response:
+        """Запрос к одному экземпляру; для идемпотентных запросов с hedge=True после
+        hedge_delay отправляется дублирующий запрос в другой экземпляр.
+
+        При ошибках из retry_on запрос повторяется до retries раз, по возможности в другой экземпляр.
+        route - шаблон пути для оценки задержки (по умолчанию сам path).
+        """
+        route = route or path
+        if not hedge or self.hedge_delay is None or len(self.upstreams) < 2:
+            failed = None
+            for attempt in range(retries + 1):
+                upstream = self.pick(exclude=failed, route=route)
+                try:
+                    return await self.send(client, method, path, upstream=upstream, route=route, **kwargs)
+                except retry_on:
+                    if attempt == retries:
+                        raise
+                    failed = upstream
+                    await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+        primary = self.pick(route=route)
+        first = asyncio.create_task(self.send(client, method, path, upstream=primary, route=route, **kwargs))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+        if done:
+            return first.result()
+
+        backup = self.pick(exclude=primary, route=route)
+        pending = {
+            first, asyncio.create_task(self.send(client, method, path, upstream=backup, route=route, **kwargs))
+        }
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def check_health(self, client: httpx.AsyncClient, timeout: float = 2.0):
+        async def check(upstream: Upstream):
+            try:
+                response = await client.get(f"{upstream.url}/", timeout=timeout)
+                upstream.healthy = response.status_code == 200
+            except httpx.HTTPError:
+                upstream.healthy = False
+
+        await asyncio.gather(*(check(upstream) for upstream in self.upstreams))
+
+    async def run_health_checks(self, client: httpx.AsyncClient, interval: float):
+        while True:
+            await self.check_health(client)
+            await asyncio.sleep(interval)
@@ -0,0 +1,81 @@
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app, role_versions
+from app.auth import create_jwt_token
+
+client = TestClient(app)
+
+def token(user_id: int, roles: list[str], role_version: int) -> dict:
+    claims = {"sub": f"user{user_id}", "uid": user_id, "rv": role_version}
+    if roles:
+        claims["roles"] = roles
+    return {"Authorization": f"Bearer {create_jwt_token(claims)}"}
+
+def version_response(version: int):
+    return {"user_id": 0, "roles_version": version}, 200
+
+class TestAuthorization:
+    """Тесты для проверки прав по claims токена в gateway"""
+
+    def setup_method(self):
+        role_versions.clear()
+
+    @patch('app.main.proxy_request')
+    def test_forbidden_without_upstream_call_for_permission(self, mock_proxy):
+        """Тест: без права roles:manage запрос отклоняется; user_service нужен только для версии ролей"""
+        mock_proxy.return_value = version_response(0)
+
+        response = client.put("/admin/users/bob/roles", json={"roles": ["admin"]}, headers=token(1, [], 0))
+
+        assert response.status_code == 403
+        mock_proxy.assert_called_once()
+        assert mock_proxy.call_args.args[1] == "/roles/version"
+
+    @patch('app.main.proxy_request')
+    def test_role_version_is_cached(self, mock_proxy):
+        """Тест: версия ролей запрашивается один раз, затем берется из кэша"""
+        headers = token(2, ["admin"], 1)
+        mock_proxy.side_effect = [
+            version_response(1),
+            ({"id": 3, "username": "bob", "roles": ["admin"], "roles_version": 4}, 200),
+            ({"id": 3, "username": "bob", "roles": [], "roles_version": 5}, 200),
+        ]
+
+        first = client.put("/admin/users/bob/roles", json={"roles": ["admin"]}, headers=headers)
+        second = client.put("/admin/users/bob/roles", json={"roles": []}, headers=headers)
+
+        assert first.status_code == 200
+        assert second.json()["roles_version"] == 5
+        assert [call.args[1] for call in mock_proxy.call_args_list] == [
+            "/roles/version", "/admin/users/bob/roles", "/admin/users/bob/roles"
+        ]
+
+    @patch('app.main.proxy_request')
+    def test_outdated_token_rejected(self, mock_proxy):
+        """Тест: токен с устаревшей версией ролей отклоняется, в том числе после смены ролей через gateway"""
+        mock_proxy.side_effect = [
+            version_response(1),
+            ({"id": 7, "username": "user7", "roles": [], "roles_version": 2}, 200),
+        ]
+        admin = token(7, ["admin"], 1)
+
+        demoted = client.put("/admin/users/user7/roles", json={"roles": []}, headers=admin)
+        reused = client.put("/admin/users/user7/roles", json={"roles": ["admin"]}, headers=admin)
+
+        assert demoted.status_code == 200
+        assert reused.status_code == 401
+        assert reused.json()["detail"] == "Token roles are outdated"
+        assert mock_proxy.call_count == 2
+
+    @patch('app.main.proxy_request')
+    def test_username_quoted_in_upstream_path(self, mock_proxy):
+        """Тест: username кодируется как один сегмент пути user_service"""
+        mock_proxy.side_effect = [
+            version_response(1),
+            ({"id": 3, "username": "a b?c", "roles": [], "roles_version": 2}, 200),
+        ]
+
+        response = client.put("/admin/users/a%20b%3Fc/roles", json={"roles": []}, headers=token(2, ["admin"], 1))
+
+        assert response.status_code == 200
+        assert mock_proxy.call_args.args[1] == "/admin/users/a%20b%3Fc/roles"
@@ -0,0 +1,206 @@
+import asyncio
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app import main
+from app.limits import MemoryBucketStore
+from app.main import app
+
+client = TestClient(app)
+
+PROFILE = {
+    "id": 7,
+    "username": "testuser",
+    "email": "test@example.com",
+    "first_name": "Test",
+    "last_name": "User",
+    "birth_date": None,
+    "phone": None,
+    "created_at": "2024-01-01T12:00:00Z",
+    "updated_at": "2024-01-01T12:00:00Z"
+}
+
+class TestBatch:
+    """Тесты для пакетного эндпоинта /batch"""
+
+    @patch('app.main.proxy_request')
+    def test_batch_concurrent(self, mock_proxy):
+        """Тест: независимые запросы выполняются параллельно, ответы - в порядке запроса"""
+        started = []
+
+        async def fake_proxy(method, endpoint, data=None, headers=None):
+            started.append(endpoint)
+            await asyncio.sleep(0.05)
+            if endpoint == "/profile":
+                return PROFILE, 200
+            return [PROFILE], 200
+
+        mock_proxy.side_effect = fake_proxy
+        response = client.post(
+            "/batch",
+            json={"requests": [
+                {"id": "profile", "path": "/profile"},
+                {"id": "users", "path": "/users"}
+            ]},
+            headers={"Authorization": "Bearer test_token"}
+        )
+
+        assert response.status_code == 200
+        items = response.json()["responses"]
+        assert [item["id"] for item in items] == ["profile", "users"]
+        assert items[0]["status"] == 200 and items[0]["body"]["username"] == "testuser"
+        assert len(items[1]["body"]) == 1
+        mock_proxy.assert_any_call("GET", "/profile", None, {"Authorization": "Bearer test_token"})
+
+    @patch('app.main.proxy_request')
+    def test_batch_dependency(self, mock_proxy):
+        """Тест: значения из ответа зависимости подставляются в следующий запрос"""
+        async def fake_proxy(method, endpoint, data=None, headers=None):
+            if method == "GET":
+                return PROFILE, 200
+            return {**PROFILE, **data}, 200
+
+        mock_proxy.side_effect = fake_proxy
+        response = client.post(
+            "/batch",
+            json={"requests": [
+                {"id": "profile", "path": "/profile"},
+                {
+                    "id": "update",
+                    "method": "PUT",
+                    "path": "/profile",
+                    "body": {"first_name": "{{profile.body.username}}-{{profile.body.id}}"},
+                    "depends_on": ["profile"]
+                }
+            ]},
+            headers={"Authorization": "Bearer test_token"}
+        )
+
+        items = response.json()["responses"]
+        assert items[1]["status"] == 200
+        assert items[1]["body"]["first_name"] == "testuser-7"
+
+    @patch('app.main.proxy_request')
+    def test_batch_failed_dependency(self, mock_proxy):
+        """Тест: при ошибке зависимости запрос не выполняется и получает 424"""
+        mock_proxy.return_value = ({"detail": "Could not validate credentials"}, 401)
+
+        response = client.post(
+            "/batch",
+            json={"requests": [
+                {"id": "profile", "path": "/profile"},
+                {"id": "update", "method": "PUT", "path": "/profile", "body": {}, "depends_on": ["profile"]}
+            ]}
+        )
+
+        items = response.json()["responses"]
+        assert items[0]["status"] == 401
+        assert items[1]["status"] == 424
+        assert mock_proxy.call_count == 1
+
+    @patch('app.main.proxy_request')
+    def test_batch_deadline(self, mock_proxy):
+        """Тест: запросы, не успевшие к общему дедлайну, получают 504"""
+        async def fake_proxy(method, endpoint, data=None, headers=None):
+            if endpoint == "/users":
+                await asyncio.sleep(1)
+            return PROFILE, 200
+
+        mock_proxy.side_effect = fake_proxy
+        response = client.post(
+            "/batch",
+            json={"timeout_ms": 50, "requests": [
+                {"id": "profile", "path": "/profile"},
+                {"id": "users", "path": "/users"}
+            ]}
+        )
+
+        items = response.json()["responses"]
+        assert items[0]["status"] == 200
+        assert items[1]["status"] == 504
+
+    def test_batch_unknown_route(self):
+        """Тест: маршрут вне списка разрешенных получает 404 в своем элементе"""
+        response = client.post("/batch", json={"requests": [{"id": "x", "path": "/metrics"}]})
+
+        assert response.status_code == 200
+        assert response.json()["responses"][0]["status"] == 404
+
+    def test_batch_invalid_dependency(self):
+        """Тест: ссылка на неизвестный запрос отклоняется целиком"""
+        response = client.post(
+            "/batch",
+            json={"requests": [{"id": "a", "path": "/users", "depends_on": ["b"]}]}
+        )
+
+        assert response.status_code == 400
+
+    def test_batch_template_outside_depends_on(self):
+        """Тест: шаблон со ссылкой на запрос вне depends_on отклоняется целиком"""
+        response = client.post(
+            "/batch",
+            json={"requests": [
+                {"id": "profile", "path": "/profile"},
+                {"id": "update", "method": "PUT", "path": "/profile", "body": {"first_name": "{{profile.body.username}}"}}
+            ]}
+        )
+
+        assert response.status_code == 400
+        assert "profile" in response.json()["detail"]
+
+    @patch('app.main.proxy_request')
+    def test_batch_item_validated(self, mock_proxy):
+        """Тест: тело элемента проверяется той же моделью, что и отдельный запрос"""
+        mock_proxy.return_value = ({"message": "User registered successfully"}, 201)
+
+        response = client.post(
+            "/batch",
+            json={"requests": [
+                {"id": "bad", "method": "POST", "path": "/register", "body": {"username": "a@b", "password": "x"}},
+                {"id": "profile", "method": "PUT", "path": "/profile", "body": {"first_name": "x" * 51}}
+            ]}
+        )
+
+        items = response.json()["responses"]
+        assert [item["status"] for item in items] == [422, 422]
+        mock_proxy.assert_not_called()
+
+    @patch('app.main.proxy_request')
+    def test_batch_item_route_limit(self, mock_proxy, monkeypatch):
+        """Тест: каждый элемент списывает токен из лимита своего маршрута"""
+        mock_proxy.return_value = ({"detail": "Incorrect username or password"}, 401)
+        monkeypatch.setattr(main, "bucket_store", MemoryBucketStore())
+        monkeypatch.setattr(main, "route_rates", {"/login": (1, 1)})
+        login = {"username": "u", "password": "p"}
+
+        response = client.post(
+            "/batch",
+            json={"requests": [
+                {"id": "first", "method": "POST", "path": "/login", "body": login},
+                {"id": "second", "method": "POST", "path": "/login", "body": login}
+            ]}
+        )
+
+        statuses = sorted(item["status"] for item in response.json()["responses"])
+        assert statuses == [401, 429]
+        assert mock_proxy.call_count == 1
+
+    @patch('app.main.proxy_request')
+    def test_batch_item_client_limit(self, mock_proxy, monkeypatch):
+        """Тест: каждый элемент списывает токен и из лимита клиента, пакет не обходит его"""
+        mock_proxy.return_value = ({"detail": "Incorrect username or password"}, 401)
+        monkeypatch.setattr(main, "bucket_store", MemoryBucketStore())
+        monkeypatch.setattr(main, "route_rates", {})
+        monkeypatch.setattr(main, "client_rate", (0.001, 2))
+        login = {"username": "u", "password": "p"}
+
+        response = client.post(
+            "/batch",
+            json={"requests": [
+                {"id": str(i), "method": "POST", "path": "/login", "body": login} for i in range(4)
+            ]}
+        )
+
+        statuses = sorted(item["status"] for item in response.json()["responses"])
+        assert response.status_code == 200
+        assert statuses == [401, 401, 429, 429]
+        assert mock_proxy.call_count == 2
@@ -0,0 +1,111 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.auth import create_jwt_token
+
+client = TestClient(main.app)
+
+@pytest.fixture
+def upstream(monkeypatch):
+    requests = []
+
+    async def handler(request: httpx.Request):
+        body = await request.aread()
+        requests.append((request, body))
+        if request.method == "PUT":
+            return httpx.Response(201, json={
+                "bucket": "avatars", "key": "alice/me.png", "size": len(body),
+                "sha256": "0" * 64, "content_type": request.headers["content-type"], "deduplicated": False,
+            })
+        if "range" in request.headers:
+            return httpx.Response(
+                206, stream=httpx.ByteStream(b"2345"), headers={"Content-Range": "bytes 2-5/10", "Content-Type": "image/png"}
+            )
+        return httpx.Response(200, stream=httpx.ByteStream(b"0123456789"), headers={"Content-Type": "image/png", "ETag": '"abc"'})
+
+    monkeypatch.setattr(main, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return requests
+
+class TestFiles:
+    """Тесты для проксирования файлов в storage_service"""
+
+    def test_upload_is_streamed_into_user_namespace(self, upstream):
+        """Тест: тело передается потоком, ключ начинается с имени пользователя"""
+        token = create_jwt_token({"sub": "alice"})
+
+        response = client.put(
+            "/files/avatars/me.png",
+            content=iter([b"part1", b"part2"]),
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "image/png"}
+        )
+
+        request, body = upstream[0]
+        assert response.status_code == 201
+        assert response.json()["url"] == "/files/avatars/alice/me.png"
+        assert request.url.path == "/api/v1/objects/avatars/alice/me.png"
+        assert body == b"part1part2"
+
+    def test_upload_requires_token(self, upstream):
+        """Тест: загрузка без токена отклоняется до обращения к storage_service"""
+        response = client.put("/files/avatars/me.png", content=b"x")
+
+        assert response.status_code == 403
+        assert upstream == []
+
+    def test_download_forwards_range(self, upstream):
+        """Тест: Range передается в storage_service, ответ 206 возвращается клиенту"""
+        full = client.get("/files/avatars/alice/me.png")
+        partial = client.get("/files/avatars/alice/me.png", headers={"Range": "bytes=2-5"})
+
+        assert full.content == b"0123456789"
+        assert full.headers["etag"] == '"abc"'
+        assert partial.status_code == 206
+        assert partial.content == b"2345"
+        assert partial.headers["content-range"] == "bytes 2-5/10"
+        assert upstream[1][0].headers["range"] == "bytes=2-5"
+
+    def test_download_is_not_sniffed(self, upstream):
+        """Тест: gateway всегда добавляет nosniff и передает Content-Disposition от storage_service"""
+        response = client.get("/files/avatars/alice/me.png")
+
+        assert response.headers["x-content-type-options"] == "nosniff"
+
+    def test_private_bucket_requires_token(self, upstream):
+        """Тест: attachments скачиваются только с токеном, avatars - без него"""
+        token = create_jwt_token({"sub": "bob"})
+
+        anonymous = client.get("/files/attachments/alice/doc.pdf")
+        invalid = client.get("/files/attachments/alice/doc.pdf", headers={"Authorization": "Bearer bad"})
+        authorized = client.get("/files/attachments/alice/doc.pdf", headers={"Authorization": f"Bearer {token}"})
+
+        assert anonymous.status_code == 403
+        assert invalid.status_code == 401
+        assert authorized.status_code == 200
+        assert len(upstream) == 1
+
+    def test_upload_error_without_json(self, monkeypatch):
+        """Тест: ошибка хранилища без JSON (например, от прокси) дает 502, а не 500"""
+        async def handler(request: httpx.Request):
+            return httpx.Response(502, text="<html>Bad Gateway</html>", headers={"Content-Type": "text/html"})
+
+        monkeypatch.setattr(main, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        token = create_jwt_token({"sub": "alice"})
+
+        response = client.put("/files/avatars/me.png", content=b"x", headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 502
+        assert response.json()["detail"] == "Upload failed"
+
+    def test_internal_token_sent(self, upstream, monkeypatch):
+        """Тест: gateway передает storage_service внутренний токен"""
+        monkeypatch.setattr(main, "STORAGE_INTERNAL_TOKEN", "internal-secret")
+        token = create_jwt_token({"sub": "alice"})
+
+        client.put(
+            "/files/avatars/me.png", content=b"x",
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "image/png"}
+        )
+        client.get("/files/avatars/alice/me.png")
+
+        assert [request.headers["x-internal-token"] for request, _ in upstream] == ["internal-secret"] * 2
@@ -0,0 +1,174 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app import main
+from app.idempotency import IdempotencyStore, fingerprint, scope_key
+from app.upstreams import UpstreamPool
+from app.auth import create_jwt_token
+
+client = TestClient(main.app)
+
+USER = {"username": "alice", "email": "alice@example.com", "password": "password123"}
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    store = IdempotencyStore()
+    monkeypatch.setattr(main, "idempotency_store", store)
+    return store
+
+class TestIdempotencyStore:
+    """Тесты для хранилища ответов по Idempotency-Key"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicates_run_once(self):
+        """Тест: параллельные запросы с одним ключом выполняются один раз"""
+        store = IdempotencyStore()
+        calls = []
+
+        async def operation():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"message": "ok"}, 201
+
+        results = await asyncio.gather(*(store.execute("k", "fp", operation) for _ in range(5)))
+
+        assert len(calls) == 1
+        assert [replayed for _, replayed in results].count(False) == 1
+        assert all(result == ({"message": "ok"}, 201) for result, _ in results)
+
+    @pytest.mark.asyncio
+    async def test_errors_not_stored(self):
+        """Тест: исключение и ответ 5xx не сохраняются, повтор выполняется заново"""
+        store = IdempotencyStore()
+        responses = iter([httpx.ConnectError("down"), ({"detail": "error"}, 503), ({"message": "ok"}, 201)])
+
+        async def operation():
+            result = next(responses)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        with pytest.raises(httpx.ConnectError):
+            await store.execute("k", "fp", operation)
+        assert (await store.execute("k", "fp", operation))[0][1] == 503
+        assert await store.execute("k", "fp", operation) == (({"message": "ok"}, 201), False)
+
+    @pytest.mark.asyncio
+    async def test_ttl_and_lru_limit(self):
+        """Тест: истекшие ключи выполняются заново, число ключей ограничено"""
+        expired = IdempotencyStore(ttl_seconds=-1)
+        limited = IdempotencyStore(max_keys=2)
+
+        async def operation():
+            return {}, 200
+
+        await expired.execute("k", "fp", operation)
+        assert (await expired.execute("k", "fp", operation))[1] is False
+
+        for key in ("a", "b", "c"):
+            await limited.execute(key, "fp", operation)
+        assert list(limited._entries) == ["b", "c"]
+
+    def test_scope_key(self):
+        """Тест: ключ привязан к владельцу токена, недопустимый ключ отклоняется"""
+        assert scope_key("k", "PUT", "/profile", "Bearer a") != scope_key("k", "PUT", "/profile", "Bearer b")
+        assert scope_key("k", "POST", "/register", None, "fp1") != scope_key("k", "POST", "/register", None, "fp2")
+        assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+        with pytest.raises(HTTPException):
+            scope_key("x" * 300, "POST", "/register", None)
+
+class TestIdempotentEndpoints:
+    """Тесты для Idempotency-Key в /register и PUT /profile"""
+
+    @patch('app.main.proxy_request')
+    def test_register_replayed(self, mock_proxy):
+        """Тест: повтор регистрации возвращает первый ответ без обращения к user_service"""
+        mock_proxy.return_value = ({"message": "User registered successfully"}, 201)
+
+        first = client.post("/register", json=USER, headers={"Idempotency-Key": "reg-1"})
+        second = client.post("/register", json=USER, headers={"Idempotency-Key": "reg-1"})
+
+        assert first.status_code == second.status_code == 201
+        assert "idempotent-replayed" not in first.headers
+        assert second.headers["idempotent-replayed"] == "true"
+        mock_proxy.assert_called_once_with("POST", "/register", USER, {"Idempotency-Key": "reg-1"})
+
+    @patch('app.main.proxy_request')
+    def test_key_reused_with_different_body(self, mock_proxy):
+        """Тест: тот же ключ того же пользователя с другим телом отклоняется с 422"""
+        mock_proxy.return_value = ({
+            "id": 1, "username": "alice", "email": "alice@example.com",
+            "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"
+        }, 200)
+        headers = {"Authorization": f"Bearer {create_jwt_token({'sub': 'alice'})}", "Idempotency-Key": "upd-2"}
+
+        client.put("/profile", json={"first_name": "Alice"}, headers=headers)
+        response = client.put("/profile", json={"first_name": "Bob"}, headers=headers)
+
+        assert response.status_code == 422
+        assert mock_proxy.call_count == 1
+
+    @patch('app.main.proxy_request')
+    def test_anonymous_keys_scoped_by_body(self, mock_proxy):
+        """Тест: совпавший ключ разных анонимных клиентов не отклоняется и не получает чужой ответ"""
+        mock_proxy.return_value = ({"message": "User registered successfully"}, 201)
+
+        client.post("/register", json=USER, headers={"Idempotency-Key": "reg-2"})
+        response = client.post("/register", json={**USER, "username": "bob"}, headers={"Idempotency-Key": "reg-2"})
+
+        assert response.status_code == 201
+        assert "idempotent-replayed" not in response.headers
+        assert mock_proxy.call_count == 2
+
+    def test_batch_rejects_key(self):
+        """Тест: Idempotency-Key для /batch отклоняется, а не игнорируется"""
+        response = client.post(
+            "/batch", json={"requests": [{"id": "users", "path": "/users"}]}, headers={"Idempotency-Key": "b-1"}
+        )
+
+        assert response.status_code == 400
+
+    @patch('app.main.proxy_request')
+    def test_profile_keys_scoped_by_token(self, mock_proxy):
+        """Тест: одинаковые ключи разных пользователей не пересекаются"""
+        mock_proxy.return_value = ({
+            "id": 1, "username": "alice", "email": "alice@example.com",
+            "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"
+        }, 200)
+        payload = {"first_name": "Alice"}
+
+        for user in ("alice", "bob"):
+            token = create_jwt_token({"sub": user})
+            client.put(
+                "/profile", json=payload,
+                headers={"Authorization": f"Bearer {token}", "Idempotency-Key": "same"}
+            )
+
+        assert mock_proxy.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_write_retried_on_connect_error(self, monkeypatch):
+        """Тест: запись с Idempotency-Key повторяется в другой экземпляр при ошибке соединения"""
+        attempts = []
+
+        async def handler(request: httpx.Request):
+            attempts.append(request.url.host)
+            if request.url.host == "a":
+                raise httpx.ConnectError("connection refused")
+            return httpx.Response(201, json={"message": "User registered successfully"})
+
+        pool = UpstreamPool(["http://a", "http://b"])
+        pool.upstreams[1].outstanding = 1
+        monkeypatch.setattr(main, "user_service", pool)
+        monkeypatch.setattr(main, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+        result = await main.proxy_request("POST", "/register", USER, {"Idempotency-Key": "reg-3"})
+        pool.upstreams[1].outstanding = 1
+        with pytest.raises(HTTPException):
+            await main.proxy_request("POST", "/register", USER, None)
+
+        assert result == ({"message": "User registered successfully"}, 201)
+        assert attempts == ["a", "b", "a"]
@@ -0,0 +1,148 @@
+import sqlite3
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.main import app
+from app.limits import (
+    AdaptiveConcurrencyLimiter, MemoryBucketStore, SQLiteBucketStore, RateLimitMiddleware,
+    parse_rate, parse_route_rates
+)
+
+client = TestClient(app)
+
+def make_limited_app(**kwargs):
+    limited = FastAPI()
+
+    @limited.get("/login")
+    async def login():
+        return {"ok": True}
+
+    @limited.get("/users")
+    async def users():
+        return {"ok": True}
+
+    limited.add_middleware(RateLimitMiddleware, **kwargs)
+    return TestClient(limited)
+
+class TestTokenBucket:
+    """Тесты для token bucket'ов"""
+
+    def test_parse(self):
+        """Тест разбора настроек лимитов"""
+        assert parse_rate("10:20") == (10.0, 20.0)
+        assert parse_rate("5") == (5.0, 5.0)
+        assert parse_route_rates("/login=1:2, /register=3") == {"/login": (1.0, 2.0), "/register": (3.0, 3.0)}
+
+    def test_memory_bucket(self):
+        """Тест: после исчерпания всплеска токены восстанавливаются со скоростью rate"""
+        store = MemoryBucketStore()
+
+        assert store.take("k", 1, 2, now=0) == 0
+        assert store.take("k", 1, 2, now=0) == 0
+        assert store.take("k", 1, 2, now=0) == 1.0
+        assert store.take("k", 1, 2, now=1) == 0
+
+    def test_sqlite_bucket_shared(self, tmp_path):
+        """Тест: два процесса с одним файлом делят один bucket"""
+        path = str(tmp_path / "limits.db")
+        first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+
+        assert first.take("k", 1, 1, now=100) == 0
+        assert second.take("k", 1, 1, now=100) > 0
+
+    def test_sqlite_bucket_locked(self, tmp_path):
+        """Тест: заблокированный файл лимитов пропускает запрос (fail open) или отклоняет его"""
+        path = str(tmp_path / "limits.db")
+        SQLiteBucketStore(path)
+        holder = sqlite3.connect(path, isolation_level=None)
+        holder.execute("BEGIN IMMEDIATE")
+        try:
+            assert SQLiteBucketStore(path, timeout=0.01).take("k", 1, 1, now=100) == 0
+            assert SQLiteBucketStore(path, fail_open=False, timeout=0.01).take("k", 1, 1, now=100) == 1.0
+        finally:
+            holder.execute("ROLLBACK")
+            holder.close()
+
+class TestRateLimitMiddleware:
+    """Тесты для ограничения частоты запросов"""
+
+    def test_client_limit(self):
+        """Тест: превышение лимита клиента дает 429 с Retry-After"""
+        limited = make_limited_app(client_rate=(1, 2))
+
+        assert limited.get("/users").status_code == 200
+        assert limited.get("/users").status_code == 200
+        response = limited.get("/users")
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+    def test_route_limit(self):
+        """Тест: лимит маршрута не затрагивает другие маршруты"""
+        limited = make_limited_app(route_rates={"/login": (1, 1)})
+
+        assert limited.get("/login").status_code == 200
+        assert limited.get("/login").status_code == 429
+        assert limited.get("/users").status_code == 200
+
+    def test_sqlite_store(self, tmp_path):
+        """Тест: с общим SQLite-файлом лимиты работают так же (списание - в пуле потоков)"""
+        limited = make_limited_app(store=SQLiteBucketStore(str(tmp_path / "limits.db")), client_rate=(1, 1))
+
+        assert limited.get("/users").status_code == 200
+        assert limited.get("/users").status_code == 429
+
+class TestAdaptiveConcurrencyLimiter:
+    """Тесты для адаптивного лимита одновременных запросов"""
+
+    def test_limit_reached(self):
+        """Тест: запросы сверх лимита отклоняются"""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+
+        assert limiter.try_acquire()
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+
+    def test_aimd(self):
+        """Тест: лимит растет при быстрых ответах и уменьшается при росте задержки и ошибках"""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=10, backoff=0.5)
+        for _ in range(50):
+            limiter.try_acquire()
+            limiter.release(0.01, ok=True)
+        grown = limiter.limit
+        assert grown > 10
+
+        limiter.try_acquire()
+        limiter.release(1.0, ok=True)
+        assert limiter.limit == grown * 0.5
+
+        limiter.try_acquire()
+        limiter.release(0.01, ok=False)
+        assert limiter.limit == grown * 0.25
+
+    def test_baseline_per_route(self):
+        """Тест: медленный, но обычный для своего маршрута вход не считается перегрузкой"""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=10, backoff=0.5)
+        for _ in range(10):
+            limiter.try_acquire()
+            limiter.release(0.01, ok=True, route="/api/v1/profile")
+            limiter.try_acquire()
+            limiter.release(0.3, ok=True, route="/api/v1/login")
+        assert limiter.limit > 10
+
+        limiter.try_acquire()
+        limiter.release(1.0, ok=True, route="/api/v1/login")
+        assert limiter.limit < 10
+        assert limiter.retry_after("/api/v1/login") == 1
+
+    def test_gateway_sheds_load(self):
+        """Тест: gateway сразу отвечает 503, когда лимит к user_service исчерпан"""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+        limiter.try_acquire()
+
+        with patch('app.main.concurrency_limiter', limiter):
+            response = client.get("/users")
+
+        assert response.status_code == 503
+        assert response.json()["detail"] == "Service overloaded"
+        assert "Retry-After" in response.headers
@@ -0,0 +1,43 @@
+import pytest
+import httpx
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app import main
+from app.main import app
+
+client = TestClient(app)
+
+class TestMetrics:
+    """Тесты для эндпоинта /metrics"""
+
+    @patch('app.main.proxy_request')
+    def test_route_metrics(self, mock_proxy):
+        """Тест учета запросов по маршруту и классу статуса"""
+        mock_proxy.return_value = ({"detail": "Username already exists"}, 400)
+        user_data = {
+            "username": "testuser",
+            "password": "testpassword123",
+            "email": "test@example.com"
+        }
+        client.post("/register", json=user_data)
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert 'http_requests_total{method="POST",route="/register",status_class="4xx"}' in response.text
+        assert 'http_requests_in_flight{method="POST",route="/register"} 0.0' in response.text
+
+    @pytest.mark.asyncio
+    async def test_upstream_metrics_use_route_template(self, monkeypatch):
+        """Тест: путь с параметром попадает в метрики шаблоном, а не значением"""
+        async def handler(request: httpx.Request):
+            return httpx.Response(200, json={"id": 1, "username": "bob", "roles": [], "roles_version": 1})
+
+        monkeypatch.setattr(main, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        await main.proxy_request(
+            "PUT", "/admin/users/bob-42/roles", {"roles": []}, None, route="/admin/users/{username}/roles"
+        )
+
+        metrics = client.get("/metrics").text
+        assert 'endpoint="/admin/users/{username}/roles"' in metrics
+        assert "bob-42" not in metrics
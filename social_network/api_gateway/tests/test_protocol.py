@@ -0,0 +1,92 @@
+import time
+import httpx
+import msgpack
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.protocol import (
+    MSGPACK, PrimaryUntilMiddleware, request_options, decode_response, remember_primary_until, _client_address
+)
+
+class TestInternalProtocol:
+    """Тесты для выбора формата запросов к user_service"""
+
+    def test_msgpack_request(self):
+        """Тест: тело кодируется в msgpack, Accept допускает оба формата"""
+        options = request_options("msgpack", {"username": "u"}, {"Authorization": "Bearer t"})
+
+        assert msgpack.unpackb(options["content"]) == {"username": "u"}
+        assert options["headers"]["Content-Type"] == MSGPACK
+        assert options["headers"]["Authorization"] == "Bearer t"
+        assert MSGPACK in options["headers"]["Accept"]
+
+    def test_json_request(self):
+        """Тест: INTERNAL_PROTOCOL=json сохраняет прежний формат"""
+        options = request_options("json", {"username": "u"}, None)
+
+        assert options == {"json": {"username": "u"}, "headers": {}}
+
+    def test_forwards_client_address(self):
+        """Тест: адрес клиента передается в user_service для ограничения попыток входа"""
+        token = _client_address.set("203.0.113.7")
+        try:
+            options = request_options("json", None, None)
+        finally:
+            _client_address.reset(token)
+
+        assert options["headers"]["X-Forwarded-For"] == "203.0.113.7"
+
+    def test_decode_by_content_type(self):
+        """Тест: ответ разбирается по Content-Type"""
+        packed = httpx.Response(200, content=msgpack.packb({"id": 1}), headers={"Content-Type": MSGPACK})
+        plain = httpx.Response(401, json={"detail": "Unauthorized"})
+
+        assert decode_response(packed) == {"id": 1}
+        assert decode_response(plain) == {"detail": "Unauthorized"}
+
+class TestPrimaryUntil:
+    """Тесты для передачи отметки read-your-writes между клиентом и user_service"""
+
+    def setup_method(self):
+        app = FastAPI()
+        app.add_middleware(PrimaryUntilMiddleware)
+
+        @app.post("/write")
+        async def write():
+            remember_primary_until(httpx.Response(201, headers={"X-Primary-Until": str(time.time() + 5)}))
+            return request_options("json", None, None)["headers"]
+
+        @app.get("/read")
+        async def read():
+            return request_options("json", None, None)["headers"]
+
+        self.client = TestClient(app)
+
+    def test_marker_returned_to_client(self):
+        """Тест: отметка из ответа user_service уходит клиенту в cookie и в следующие запросы (как в /batch)"""
+        response = self.client.post("/write")
+
+        assert response.cookies["primary_until"] == response.headers["x-primary-until"]
+        assert "max-age=5" in response.headers["set-cookie"].lower()
+        assert response.json()["X-Primary-Until"] == response.headers["x-primary-until"]
+
+    def test_marker_forwarded_from_cookie_or_header(self):
+        """Тест: действующая отметка клиента передается в user_service, истекшая - нет"""
+        until = str(time.time() + 5)
+
+        self.client.cookies.set("primary_until", until)
+        assert self.client.get("/read").json()["X-Primary-Until"] == f"{float(until):.3f}"
+        self.client.cookies.clear()
+        assert "X-Primary-Until" in self.client.get("/read", headers={"X-Primary-Until": until}).json()
+        assert "X-Primary-Until" not in self.client.get("/read", headers={"X-Primary-Until": "1"}).json()
+        assert "set-cookie" not in self.client.get("/read").headers
+
+    def test_marker_is_capped(self):
+        """Тест: отметка дальше now + PRIMARY_STICKINESS_SECONDS обрезается до этого окна"""
+        self.client.cookies.set("primary_until", "99999999999")
+        from_cookie = self.client.get("/read").json()["X-Primary-Until"]
+        self.client.cookies.clear()
+        from_header = self.client.get("/read", headers={"X-Primary-Until": "99999999999"}).json()["X-Primary-Until"]
+
+        assert float(from_cookie) <= time.time() + 5
+        assert float(from_header) <= time.time() + 5
+        assert "X-Primary-Until" not in self.client.get("/read", headers={"X-Primary-Until": "inf"}).json()
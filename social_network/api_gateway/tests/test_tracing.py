@@ -0,0 +1,44 @@
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.tracing import inject_headers
+
+client = TestClient(app)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+class TestTracePropagation:
+    """Тесты для передачи traceparent в сервис пользователей"""
+
+    @patch('app.main.proxy_request')
+    def test_traceparent_propagated(self, mock_proxy):
+        """Тест: исходящие заголовки продолжают входящий трейс"""
+        captured = {}
+
+        async def fake_proxy(method, endpoint, data=None, headers=None):
+            captured.update(inject_headers(headers))
+            return {"message": "User registered successfully"}, 201
+
+        mock_proxy.side_effect = fake_proxy
+        user_data = {
+            "username": "testuser",
+            "password": "testpassword123",
+            "email": "test@example.com"
+        }
+
+        response = client.post(
+            "/register",
+            json=user_data,
+            headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"}
+        )
+
+        assert response.status_code == 201
+        trace_id = captured["traceparent"].split("-")[1]
+        assert trace_id == TRACE_ID
+        assert captured["traceparent"].endswith("-00")
+
+    def test_no_trace_no_headers(self):
+        """Тест: вне трейса заголовки не изменяются"""
+        assert inject_headers(None) is None
+        assert inject_headers({"Authorization": "Bearer x"}) == {"Authorization": "Bearer x"}
@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+import httpx
+from app.upstreams import UpstreamPool
+
+def make_client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+class TestUpstreamPool:
+    """Тесты для клиентской балансировки между экземплярами user_service"""
+
+    def test_pick_prefers_fewer_outstanding(self):
+        """Тест: из двух кандидатов выбирается менее загруженный"""
+        pool = UpstreamPool(["http://a", "http://b"])
+        pool.upstreams[0].outstanding = 10
+
+        assert all(pool.pick().url == "http://b" for _ in range(20))
+
+    def test_ejected_upstream_skipped(self):
+        """Тест: исключенный экземпляр не выбирается, пока есть другие"""
+        pool = UpstreamPool(["http://a", "http://b"], max_failures=2)
+        a = pool.upstreams[0]
+        pool.record(a, 0.01, ok=False)
+        pool.record(a, 0.01, ok=False)
+
+        assert all(pool.pick().url == "http://b" for _ in range(20))
+
+    def test_all_ejected_still_picks(self):
+        """Тест: если исключены все, запрос все равно уходит в какой-то экземпляр"""
+        pool = UpstreamPool(["http://a"], max_failures=1)
+        pool.record(pool.upstreams[0], 0.01, ok=False)
+
+        assert pool.pick().url == "http://a"
+
+    def test_latency_outlier_ejected(self):
+        """Тест: экземпляр с задержкой сильно выше медианы исключается"""
+        pool = UpstreamPool(["http://a", "http://b", "http://c"], latency_factor=3.0)
+        a, b, c = pool.upstreams
+        pool.record(b, 0.02, ok=True)
+        pool.record(c, 0.02, ok=True)
+        pool.record(a, 1.0, ok=True)
+
+        assert a.ejected_until > 0
+        assert all(pool.pick() is not a for _ in range(20))
+
+    def test_latency_compared_per_route(self):
+        """Тест: медленный маршрут (вход с bcrypt) не делает экземпляр выбросом среди быстрых"""
+        pool = UpstreamPool(["http://a", "http://b", "http://c"], latency_factor=3.0)
+        a, b, c = pool.upstreams
+        for upstream in (a, b, c):
+            pool.record(upstream, 0.01, ok=True, route="/api/v1/profile")
+        for upstream in (b, c):
+            pool.record(upstream, 0.3, ok=True, route="/api/v1/login")
+        for _ in range(10):
+            pool.record(a, 0.3, ok=True, route="/api/v1/login")
+            pool.record(a, 0.01, ok=True, route="/api/v1/profile")
+
+        assert a.ejected_until == 0
+        pool.record(a, 5.0, ok=True, route="/api/v1/profile")
+        assert a.ejected_until > 0
+
+    @pytest.mark.asyncio
+    async def test_connection_errors_eject(self):
+        """Тест: ошибки соединения учитываются и приводят к исключению экземпляра"""
+        def handler(request):
+            if request.url.host == "a":
+                raise httpx.ConnectError("refused")
+            return httpx.Response(200, json={})
+
+        pool = UpstreamPool(["http://a", "http://b"], max_failures=1)
+        async with make_client(handler) as client:
+            with pytest.raises(httpx.ConnectError):
+                await pool.send(client, "GET", "/", upstream=pool.upstreams[0])
+            response = await pool.request(client, "GET", "/")
+
+        assert response.status_code == 200
+        assert pool.upstreams[0].outstanding == 0
+
+    @pytest.mark.asyncio
+    async def test_hedged_request(self):
+        """Тест: при медленном первом экземпляре отвечает дублирующий запрос"""
+        async def handler(request):
+            if request.url.host == "slow":
+                await asyncio.sleep(1)
+            return httpx.Response(200, json={"host": request.url.host})
+
+        pool = UpstreamPool(["http://slow", "http://fast"], hedge_delay=0.01)
+        pool.upstreams[1].outstanding = 1  # первым выбирается slow
+        async with make_client(handler) as client:
+            response = await pool.request(client, "GET", "/users", hedge=True)
+
+        assert response.json() == {"host": "fast"}
+
+    @pytest.mark.asyncio
+    async def test_health_check(self):
+        """Тест: health check помечает недоступный экземпляр"""
+        def handler(request):
+            if request.url.host == "down":
+                return httpx.Response(503)
+            return httpx.Response(200, json={})
+
+        pool = UpstreamPool(["http://up", "http://down"])
+        async with make_client(handler) as client:
+            await pool.check_health(client)
+
+        assert pool.upstreams[0].healthy
+        assert not pool.upstreams[1].healthy
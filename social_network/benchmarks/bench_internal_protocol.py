@@ -0,0 +1,56 @@
+"""Сравнение JSON и msgpack для внутренних ответов user_service -> gateway.
+
+Запуск: python benchmarks/bench_internal_protocol.py [число_пользователей]
+
+Кодирование повторяет JSONResponse из Starlette, разбор - response.json() из httpx.
+"""
+import json
+import sys
+import timeit
+from datetime import datetime, date, timezone
+import msgpack
+
+def make_user(i: int) -> dict:
+    # Словарь в том виде, в каком его отдает jsonable_encoder(UserResponse)
+    now = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc).isoformat()
+    return {
+        "id": i,
+        "username": f"user{i}",
+        "email": f"user{i}@example.com",
+        "first_name": "Иван",
+        "last_name": "Петров",
+        "birth_date": date(1990, 1, 1).isoformat(),
+        "phone": "+79990000000",
+        "created_at": now,
+        "updated_at": now,
+    }
+
+def json_encode(content) -> bytes:
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def bench(name: str, payload, number: int):
+    encoded_json = json_encode(payload)
+    encoded_msgpack = msgpack.packb(payload)
+    results = {
+        "json encode": timeit.timeit(lambda: json_encode(payload), number=number),
+        "json decode": timeit.timeit(lambda: json.loads(encoded_json), number=number),
+        "msgpack encode": timeit.timeit(lambda: msgpack.packb(payload), number=number),
+        "msgpack decode": timeit.timeit(lambda: msgpack.unpackb(encoded_msgpack), number=number),
+    }
+    print(f"\n{name}")
+    print(f"  size: json {len(encoded_json)} B, msgpack {len(encoded_msgpack)} B "
+          f"({100 * (1 - len(encoded_msgpack) / len(encoded_json)):.1f}% smaller)")
+    for key, total in results.items():
+        print(f"  {key:15s} {total / number * 1e6:8.2f} us")
+    json_total = results["json encode"] + results["json decode"]
+    msgpack_total = results["msgpack encode"] + results["msgpack decode"]
+    print(f"  encode+decode   {json_total / msgpack_total:.2f}x faster with msgpack")
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    login = {"access_token": "x" * 160, "token_type": "bearer", "user": make_user(1)}
+    bench("/login", login, number=50000)
+    bench(f"/users ({users} users)", [make_user(i) for i in range(users)], number=max(100, 100000 // users))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Поиск пользователя при входе: OR по username/email против поиска по одному индексу lower(...).
+
+Запуск: python benchmarks/bench_login_lookup.py [число_пользователей]   (по умолчанию 10 000 000)
+
+БД - BENCH_DATABASE_URL (PostgreSQL, таблицы создаются в отдельной схеме bench_login
+и удаляются после замера) или временный SQLite. Индексы lower(...) строятся после
+загрузки строк той же миграцией, что и для существующей таблицы (create_identity_indexes),
+поэтому печатается и ее время.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "user_service"))
+
+from sqlalchemy import bindparam, create_engine, or_, select, text
+from sqlalchemy.orm import Session
+from app import queries
+from app.models import Base, IDENTITY_INDEXES, User, UserRole, create_identity_indexes
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL")
+LOOKUPS = 2000
+
+# Прежний запрос входа: условие по двум индексам, регистр учитывается
+LOGIN_BY_USERNAME_OR_EMAIL = (
+    select(*queries.PROFILE_COLUMNS, User.password_hash, User.roles_version, UserRole.role)
+    .outerjoin(UserRole, UserRole.user_id == User.id)
+    .where(or_(User.username == bindparam("identifier"), User.email == bindparam("identifier")))
+)
+
+def make_engine(root: str):
+    if BENCH_DATABASE_URL:
+        engine = create_engine(BENCH_DATABASE_URL, connect_args={"options": "-csearch_path=bench_login"})
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA IF EXISTS bench_login CASCADE"))
+            conn.execute(text("CREATE SCHEMA bench_login"))
+        return engine
+    return create_engine(f"sqlite:///{root}/users.db")
+
+def fill(engine, users: int):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for name in IDENTITY_INDEXES:
+            conn.execute(text(f"DROP INDEX {name}"))
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(
+                "INSERT INTO users (username, email, password_hash) "
+                "SELECT 'user' || i, 'user' || i || '@example.com', 'hash' FROM generate_series(1, :users) AS i"
+            ), {"users": users})
+            conn.execute(text("ANALYZE users"))
+        else:
+            conn.execute(text(
+                "INSERT INTO users (username, email, password_hash) "
+                "WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < :users) "
+                "SELECT 'user' || i, 'user' || i || '@example.com', 'hash' FROM seq"
+            ), {"users": users})
+            conn.execute(text("ANALYZE"))
+
+def per_lookup_us(db: Session, lookup, identifiers: list[str]) -> float:
+    lookups = iter(identifiers)
+    seconds = timeit.timeit(lambda: lookup(db, next(lookups)), number=len(identifiers))
+    return seconds / len(identifiers) * 1e6
+
+def or_lookup(db: Session, identifier: str):
+    return db.execute(LOGIN_BY_USERNAME_OR_EMAIL, {"identifier": identifier}).mappings().all()
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    with tempfile.TemporaryDirectory() as root:
+        engine = make_engine(root)
+        try:
+            start = time.perf_counter()
+            fill(engine, users)
+            fill_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            create_identity_indexes(engine)
+            index_seconds = time.perf_counter() - start
+
+            sample = [random.randint(1, users) for _ in range(LOOKUPS)]
+            usernames = [f"user{i}" for i in sample]
+            emails = [f"user{i}@example.com" for i in sample]
+            with Session(engine) as db:
+                # Прогрев кэша страниц и скомпилированных запросов
+                per_lookup_us(db, queries.get_login_user, usernames[:200] + emails[:200])
+                per_lookup_us(db, or_lookup, usernames[:200])
+                results = {
+                    "OR, username": per_lookup_us(db, or_lookup, usernames),
+                    "OR, email": per_lookup_us(db, or_lookup, emails),
+                    "lower(username) index": per_lookup_us(db, queries.get_login_user, usernames),
+                    "lower(email) index": per_lookup_us(db, queries.get_login_user, emails),
+                    "lower(username) index, other case": per_lookup_us(
+                        db, queries.get_login_user, [name.upper() for name in usernames]
+                    ),
+                }
+        finally:
+            if engine.dialect.name == "postgresql":
+                with engine.begin() as conn:
+                    conn.execute(text("DROP SCHEMA IF EXISTS bench_login CASCADE"))
+            engine.dispose()
+
+    print(f"database: {engine.dialect.name}, users: {users}")
+    print(f"load: {fill_seconds:.1f} s, lower() index migration: {index_seconds:.1f} s")
+    for name, microseconds in results.items():
+        print(f"{name:36} {microseconds:8.1f} us/lookup")
+
+if __name__ == "__main__":
+    main()
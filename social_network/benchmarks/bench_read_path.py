@@ -0,0 +1,78 @@
+"""Сравнение ORM и Core-пути чтения для /profile и /users user_service.
+
+Запуск: python benchmarks/bench_read_path.py [число_пользователей]
+
+Оба варианта проходят путь обработчика до готового JSON: запрос к SQLite в
+памяти, преобразование в ответ и проверку response_model, как это делает FastAPI.
+"""
+import os
+import sys
+import timeit
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "user_service"))
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app import queries
+from app.models import Base, User
+from app.schemas import UserResponse
+
+profile_adapter = TypeAdapter(UserResponse)
+users_adapter = TypeAdapter(list[UserResponse])
+
+def make_session(users: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db = Session()
+    db.add_all(
+        User(
+            username=f"user{i}", email=f"user{i}@example.com", password_hash="x" * 60,
+            first_name="Иван", last_name="Петров", phone="+79990000000",
+        )
+        for i in range(users)
+    )
+    db.commit()
+    db.close()
+    return Session
+
+def orm_profile(Session):
+    # Прежний путь: ORM-объект, model_validate в обработчике и повторная проверка в FastAPI
+    with Session() as db:
+        user = db.query(User).filter(User.username == "user1").first()
+        response = UserResponse.model_validate(user)
+        return profile_adapter.dump_json(profile_adapter.validate_python(response.model_dump()))
+
+def core_profile(Session):
+    with Session() as db:
+        return profile_adapter.dump_json(profile_adapter.validate_python(queries.get_profile(db, "user1")))
+
+def orm_users(Session):
+    with Session() as db:
+        users = [UserResponse.model_validate(user).model_dump() for user in db.query(User).all()]
+        return users_adapter.dump_json(users_adapter.validate_python(users))
+
+def core_users(Session):
+    with Session() as db:
+        return users_adapter.dump_json(users_adapter.validate_python(queries.get_profiles(db)))
+
+def bench(name: str, orm, core, Session, number: int):
+    assert orm(Session) == core(Session)
+    orm_time = min(timeit.repeat(lambda: orm(Session), number=number, repeat=3)) / number
+    core_time = min(timeit.repeat(lambda: core(Session), number=number, repeat=3)) / number
+    print(f"\n{name}")
+    print(f"  orm   {orm_time * 1e6:9.1f} us")
+    print(f"  core  {core_time * 1e6:9.1f} us  ({orm_time / core_time:.2f}x, "
+          f"{(orm_time - core_time) * 1e6:.1f} us CPU saved per request)")
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    Session = make_session(users)
+    bench("/profile", orm_profile, core_profile, Session, number=2000)
+    bench(f"/users ({users} users)", orm_users, core_users, Session, number=max(20, 20000 // users))
+
+if __name__ == "__main__":
+    main()
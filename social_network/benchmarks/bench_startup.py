@@ -0,0 +1,78 @@
+"""Время холодного запуска воркера user_service и первого входа после него.
+
+Запуск: python benchmarks/bench_startup.py [число_запусков]   (по умолчанию 20)
+
+Каждый замер - отдельный процесс python, как новый воркер или контейнер: время
+импорта app.main и время первого /login без прогрева и с прогревом (STARTUP_WARMUP),
+а также отчет по этапам запуска (python -m app.startup --warmup). БД - временный SQLite.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "user_service")
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import app.main
+print(time.perf_counter() - start)
+"""
+
+# Регистрация - отдельным процессом, чтобы замер входа начинался с холодного воркера
+REGISTER_SCRIPT = """
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import create_tables
+create_tables()
+TestClient(app).post("/api/v1/register", json={"username": "bench", "email": "bench@example.com", "password": "password123"})
+"""
+
+LOGIN_SCRIPT = """
+import time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+with TestClient(app) as client:
+    ready = time.perf_counter()
+    client.post("/api/v1/login", json={"username": "bench", "password": "password123"}).raise_for_status()
+    login = time.perf_counter()
+    client.post("/api/v1/login", json={"username": "bench", "password": "password123"}).raise_for_status()
+print(ready - start, login - ready, time.perf_counter() - login)
+"""
+
+def run(script: str, env: dict) -> list[float]:
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=SERVICE_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return [float(value) for value in output.split()]
+
+def median_ms(values) -> float:
+    return statistics.median(values) * 1000
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as root:
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{root}/users.db", "STARTUP_WARMUP": "false"}
+        run(REGISTER_SCRIPT, env)
+
+        imports = [run(IMPORT_SCRIPT, env)[0] for _ in range(runs)]
+        print(f"import app.main:        median {median_ms(imports):7.1f} ms, min {min(imports) * 1000:7.1f} ms")
+        for warmup in ("false", "true"):
+            samples = [run(LOGIN_SCRIPT, {**env, "STARTUP_WARMUP": warmup}) for _ in range(runs)]
+            ready, first, second = (median_ms(column) for column in zip(*samples))
+            print(
+                f"STARTUP_WARMUP={warmup:5}:  ready {ready:7.1f} ms, first /login {first:6.1f} ms, "
+                f"second /login {second:6.1f} ms"
+            )
+
+        report = subprocess.run(
+            [sys.executable, "-m", "app.startup", "--warmup"],
+            cwd=SERVICE_DIR, env=env, check=True, capture_output=True, text=True
+        ).stdout
+        print(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Пропускная способность загрузки/скачивания storage_service и пиковая память (RSS) сервера.
+
+Запуск: python benchmarks/bench_storage.py [размер_в_МБ]   (по умолчанию 1024)
+
+Сервис запускается в отдельном процессе uvicorn с временным STORAGE_ROOT; файл
+генерируется на лету, поэтому клиент тоже не держит его в памяти. Пиковый RSS
+берется из VmHWM в /proc (только Linux).
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "storage_service")
+CHUNK = b"\0" * (1024 * 1024)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def rss_mb(pid: int, field: str) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def body(size_mb: int, salt: bytes):
+    # Первый блок уникален, чтобы повторный запуск не попал в дедупликацию
+    yield salt.ljust(len(CHUNK), b"\0")
+    for _ in range(size_mb - 1):
+        yield CHUNK
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    port = free_port()
+    with tempfile.TemporaryDirectory() as root:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=SERVICE_DIR,
+            env={**os.environ, "STORAGE_ROOT": root, "MAX_UPLOAD_BYTES": str((size_mb + 1) * 1024 ** 2)},
+        )
+        try:
+            base = f"http://127.0.0.1:{port}"
+            for _ in range(100):
+                try:
+                    httpx.get(base)
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            idle_rss = rss_mb(server.pid, "VmRSS")
+            timeout = httpx.Timeout(300.0)
+
+            start = time.perf_counter()
+            response = httpx.put(
+                f"{base}/api/v1/objects/attachments/bench/file.bin",
+                content=body(size_mb, os.urandom(16)),
+                timeout=timeout,
+            )
+            upload_seconds = time.perf_counter() - start
+            response.raise_for_status()
+            upload_peak = rss_mb(server.pid, "VmHWM")
+
+            start = time.perf_counter()
+            received = 0
+            with httpx.stream("GET", f"{base}/api/v1/objects/attachments/bench/file.bin", timeout=timeout) as download:
+                for chunk in download.iter_raw():
+                    received += len(chunk)
+            download_seconds = time.perf_counter() - start
+            download_peak = rss_mb(server.pid, "VmHWM")
+        finally:
+            server.terminate()
+            server.wait()
+
+    assert received == size_mb * 1024 ** 2
+    print(f"file size:   {size_mb} MB")
+    print(f"upload:      {size_mb / upload_seconds:8.1f} MB/s ({upload_seconds:.2f} s, sha256 + dedup included)")
+    print(f"download:    {size_mb / download_seconds:8.1f} MB/s ({download_seconds:.2f} s)")
+    print(f"server RSS:  idle {idle_rss:.1f} MB, peak after upload {upload_peak:.1f} MB, "
+          f"peak after download {download_peak:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from sqlalchemy import Integer, column, select, true, union_all, update, delete, values, tuple_
+from typing import Optional
+from .schemas import (
+    PostCreateRequest, CommentCreateRequest, CommentsPrefetchRequest,
+    PostResponse, CommentResponse, CommentPage, MessageResponse
+)
+from .models import get_db, Post, Comment
+from .pagination import encode_cursor, decode_cursor
+
+router = APIRouter()
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def build_page(comments: list[Comment], limit: int) -> CommentPage:
+    """Формирование страницы: лишняя (limit + 1) запись означает, что есть продолжение"""
+    has_more = len(comments) > limit
+    comments = comments[:limit]
+    next_cursor = None
+    if has_more:
+        last = comments[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return CommentPage(
+        items=[CommentResponse.model_validate(comment) for comment in comments],
+        next_cursor=next_cursor
+    )
+
+@router.post("/posts", response_model=PostResponse, status_code=status.HTTP_201_CREATED)
+async def create_post(request: PostCreateRequest, db: Session = Depends(get_db)):
+    """Создание поста"""
+    post = Post(author_id=request.author_id, content=request.content)
+    db.add(post)
+    db.commit()
+    db.refresh(post)
+    return PostResponse.model_validate(post)
+
+@router.get("/posts/{post_id}", response_model=PostResponse)
+async def get_post(post_id: int, db: Session = Depends(get_db)):
+    """Получение поста вместе со счетчиком комментариев"""
+    post = db.get(Post, post_id)
+    if not post:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
+    return PostResponse.model_validate(post)
+
+@router.post(
+    "/posts/{post_id}/comments",
+    response_model=CommentResponse,
+    status_code=status.HTTP_201_CREATED
+)
+async def create_comment(post_id: int, request: CommentCreateRequest, db: Session = Depends(get_db)):
+    """Добавление комментария с атомарным увеличением comments_count"""
+    # UPDATE ... SET comments_count = comments_count + 1 блокирует строку поста
+    # и заодно проверяет его существование без отдельного SELECT
+    result = db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(comments_count=Post.comments_count + 1)
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
+    comment = Comment(post_id=post_id, author_id=request.author_id, content=request.content)
+    db.add(comment)
+    db.commit()
+    db.refresh(comment)
+    return CommentResponse.model_validate(comment)
+
+@router.delete("/posts/{post_id}/comments/{comment_id}", response_model=MessageResponse)
+async def delete_comment(post_id: int, comment_id: int, db: Session = Depends(get_db)):
+    """Удаление комментария с атомарным уменьшением comments_count"""
+    result = db.execute(
+        delete(Comment).where(Comment.id == comment_id, Comment.post_id == post_id)
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Comment not found"
+        )
+    db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(comments_count=Post.comments_count - 1)
+    )
+    db.commit()
+    return MessageResponse(message="Comment deleted successfully")
+
+@router.get("/posts/{post_id}/comments", response_model=CommentPage)
+async def get_comments(
+    post_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Курсорная пагинация комментариев поста по (created_at, id)"""
+    if db.get(Post, post_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
+    query = select(Comment).where(Comment.post_id == post_id)
+    if cursor:
+        created_at, comment_id = decode_cursor(cursor)
+        query = query.where(tuple_(Comment.created_at, Comment.id) > tuple_(created_at, comment_id))
+    query = query.order_by(Comment.created_at, Comment.id).limit(limit + 1)
+    comments = db.scalars(query).all()
+    return build_page(comments, limit)
+
+def first_page_ids(db: Session, post_ids: list[int], limit: int):
+    """id первых limit комментариев каждого поста; для каждого поста читается только начало индекса.
+
+    PostgreSQL - LATERAL-подзапрос с LIMIT на пост, остальные СУБД (SQLite в тестах) - UNION ALL
+    таких же подзапросов.
+    """
+    def first_comments(post_id):
+        return (
+            select(Comment.id)
+            .where(Comment.post_id == post_id)
+            .order_by(Comment.created_at, Comment.id)
+            .limit(limit)
+        )
+
+    if db.get_bind().dialect.name == "postgresql":
+        requested = values(column("post_id", Integer), name="requested").data([(post_id,) for post_id in post_ids])
+        first_page = first_comments(requested.c.post_id).lateral("first_page")
+        return select(first_page.c.id).select_from(requested).join(first_page, true())
+    pages = [first_comments(post_id).subquery() for post_id in post_ids]
+    return union_all(*(select(page.c.id) for page in pages))
+
+@router.post("/comments/prefetch", response_model=dict[int, CommentPage])
+async def prefetch_comments(request: CommentsPrefetchRequest, db: Session = Depends(get_db)):
+    """Первые страницы комментариев для нескольких постов одним запросом (для ленты)"""
+    post_ids = list(dict.fromkeys(request.post_ids))
+    query = (
+        select(Comment)
+        .where(Comment.id.in_(first_page_ids(db, post_ids, request.limit + 1)))
+        .order_by(Comment.post_id, Comment.created_at, Comment.id)
+    )
+    grouped: dict[int, list[Comment]] = {post_id: [] for post_id in post_ids}
+    for comment in db.scalars(query):
+        grouped[comment.post_id].append(comment)
+    return {post_id: build_page(comments, request.limit) for post_id, comments in grouped.items()}
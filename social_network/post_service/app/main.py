@@ -0,0 +1,24 @@
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from .handlers import router
+
+app = FastAPI(
+    title="Post Service",
+    description="Сервис для управления постами и комментариями",
+    version="1.0.0"
+)
+
+# Настройка CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(router, prefix="/api/v1")
+
+@app.get("/")
+async def root():
+    return {"message": "Post Service API", "version": "1.0.0"}
@@ -0,0 +1,13 @@
+"""Миграция схемы post_service: таблицы постов и комментариев с индексами.
+
+Запуск до старта сервиса (в Dockerfile - перед uvicorn): python -m app.migrate
+Повторный запуск безопасен: существующие таблицы и индексы не пересоздаются.
+"""
+from .models import create_tables, engine
+
+def main():
+    create_tables()
+    print(f"migrated {engine.url.render_as_string(hide_password=True)}")
+
+if __name__ == "__main__":
+    main()
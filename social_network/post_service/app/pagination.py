@@ -0,0 +1,21 @@
+from fastapi import HTTPException, status
+from datetime import datetime
+import base64
+
+def encode_cursor(created_at: datetime, comment_id: int) -> str:
+    """Кодирование курсора (created_at, id) в непрозрачную строку"""
+    raw = f"{created_at.isoformat()}|{comment_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Разбор курсора, полученного от клиента"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_at, comment_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except (ValueError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
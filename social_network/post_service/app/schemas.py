@@ -0,0 +1,45 @@
+from pydantic import BaseModel, constr, conint, Field
+from typing import Optional
+from datetime import datetime
+
+class PostCreateRequest(BaseModel):
+    author_id: int = Field(..., description="Author user id")
+    content: constr(min_length=1, max_length=10000) = Field(..., description="Post content")
+
+class CommentCreateRequest(BaseModel):
+    author_id: int = Field(..., description="Author user id")
+    content: constr(min_length=1, max_length=2000) = Field(..., description="Comment content")
+
+class CommentsPrefetchRequest(BaseModel):
+    post_ids: list[int] = Field(..., min_length=1, max_length=100, description="Post ids")
+    limit: conint(ge=1, le=100) = Field(20, description="Page size per post")
+
+class PostResponse(BaseModel):
+    id: int
+    author_id: int
+    content: str
+    is_published: bool
+    comments_count: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class CommentResponse(BaseModel):
+    id: int
+    post_id: int
+    author_id: int
+    content: str
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class CommentPage(BaseModel):
+    items: list[CommentResponse]
+    next_cursor: Optional[str] = None
+
+class MessageResponse(BaseModel):
+    message: str
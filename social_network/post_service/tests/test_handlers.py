@@ -0,0 +1,166 @@
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.main import app
+from app.models import Base, get_db, Post, Comment
+
+# Создаем тестовую базу данных в памяти
+SQLALCHEMY_DATABASE_URL = "sqlite://"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+# Создаем таблицы для тестов
+Base.metadata.create_all(bind=engine)
+
+client = TestClient(app)
+
+def create_post():
+    response = client.post("/api/v1/posts", json={"author_id": 1, "content": "Hello"})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def create_comments(post_id: int, count: int):
+    return [
+        client.post(
+            f"/api/v1/posts/{post_id}/comments",
+            json={"author_id": 2, "content": f"comment {i}"}
+        ).json()["id"]
+        for i in range(count)
+    ]
+
+class TestComments:
+    """Тесты для комментариев и счетчика comments_count"""
+
+    def setup_method(self):
+        """Очистка базы данных перед каждым тестом"""
+        db = TestingSessionLocal()
+        db.query(Comment).delete()
+        db.query(Post).delete()
+        db.commit()
+        db.close()
+
+    def test_create_comment_increments_counter(self):
+        """Тест увеличения счетчика при добавлении комментария"""
+        post_id = create_post()
+        create_comments(post_id, 3)
+
+        response = client.get(f"/api/v1/posts/{post_id}")
+
+        assert response.status_code == 200
+        assert response.json()["comments_count"] == 3
+
+    def test_create_comment_missing_post(self):
+        """Тест добавления комментария к несуществующему посту"""
+        response = client.post(
+            "/api/v1/posts/999/comments",
+            json={"author_id": 2, "content": "orphan"}
+        )
+
+        assert response.status_code == 404
+        db = TestingSessionLocal()
+        assert db.query(Comment).count() == 0
+        db.close()
+
+    def test_delete_comment_decrements_counter(self):
+        """Тест уменьшения счетчика при удалении комментария"""
+        post_id = create_post()
+        comment_ids = create_comments(post_id, 2)
+
+        response = client.delete(f"/api/v1/posts/{post_id}/comments/{comment_ids[0]}")
+        assert response.status_code == 200
+
+        # Повторное удаление не должно менять счетчик
+        response = client.delete(f"/api/v1/posts/{post_id}/comments/{comment_ids[0]}")
+        assert response.status_code == 404
+
+        assert client.get(f"/api/v1/posts/{post_id}").json()["comments_count"] == 1
+
+    def test_cursor_pagination(self):
+        """Тест обхода всех комментариев по курсору без пропусков и повторов"""
+        post_id = create_post()
+        comment_ids = create_comments(post_id, 7)
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get(f"/api/v1/posts/{post_id}/comments", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            seen.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == comment_ids
+
+    def test_invalid_cursor(self):
+        """Тест обработки невалидного курсора"""
+        post_id = create_post()
+
+        response = client.get(f"/api/v1/posts/{post_id}/comments", params={"cursor": "@@@"})
+
+        assert response.status_code == 400
+
+    def test_prefetch_first_pages(self):
+        """Тест получения первых страниц для нескольких постов одним запросом"""
+        first_post = create_post()
+        second_post = create_post()
+        empty_post = create_post()
+        first_ids = create_comments(first_post, 4)
+        second_ids = create_comments(second_post, 1)
+
+        response = client.post(
+            "/api/v1/comments/prefetch",
+            json={"post_ids": [first_post, second_post, empty_post], "limit": 2}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["id"] for item in data[str(first_post)]["items"]] == first_ids[:2]
+        assert data[str(first_post)]["next_cursor"] is not None
+        assert [item["id"] for item in data[str(second_post)]["items"]] == second_ids
+        assert data[str(second_post)]["next_cursor"] is None
+        assert data[str(empty_post)]["items"] == []
+
+        # Курсор из prefetch продолжает обычную пагинацию
+        response = client.get(
+            f"/api/v1/posts/{first_post}/comments",
+            params={"cursor": data[str(first_post)]["next_cursor"], "limit": 2}
+        )
+        assert [item["id"] for item in response.json()["items"]] == first_ids[2:]
+
+class TestMigrate:
+    """Тесты для миграции схемы"""
+
+    def test_migrate_cli(self, tmp_path):
+        """Тест: python -m app.migrate создает таблицы и безопасен при повторном запуске"""
+        url = f"sqlite:///{tmp_path}/posts.db"
+        for _ in range(2):
+            subprocess.run(
+                [sys.executable, "-m", "app.migrate"], cwd=os.path.join(os.path.dirname(__file__), ".."),
+                env={**os.environ, "DATABASE_URL": url}, check=True, capture_output=True
+            )
+
+        tables = set(inspect(create_engine(url)).get_table_names())
+        assert {"posts", "comments"} <= tables
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from typing import Optional
+from .schemas import ObjectResponse
+from .storage import LocalDiskBackend, ObjectStorage, ObjectTooLarge, safe_content_type, validate_key
+from .responses import SendfileResponse
+import os
+import secrets
+
+STORAGE_ROOT = os.getenv("STORAGE_ROOT", "/data")
+STORAGE_BUCKETS = {
+    bucket.strip() for bucket in os.getenv("STORAGE_BUCKETS", "avatars,attachments").split(",") if bucket.strip()
+}
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(2 * 1024 ** 3)))
+# Общий с gateway секрет: сервис не проверяет пользователей и принимает запросы только от gateway
+STORAGE_INTERNAL_TOKEN = os.getenv("STORAGE_INTERNAL_TOKEN")
+
+def verify_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """Проверка X-Internal-Token, если STORAGE_INTERNAL_TOKEN задан"""
+    if STORAGE_INTERNAL_TOKEN and not (
+        x_internal_token and secrets.compare_digest(x_internal_token, STORAGE_INTERNAL_TOKEN)
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal token required")
+
+router = APIRouter(dependencies=[Depends(verify_internal_token)])
+storage = None
+
+def get_storage() -> ObjectStorage:
+    global storage
+    if storage is None:
+        storage = LocalDiskBackend(STORAGE_ROOT)
+    return storage
+
+def check_location(bucket: str, key: str):
+    if bucket not in STORAGE_BUCKETS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bucket not found")
+    if not validate_key(key):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid object key")
+
+@router.put("/objects/{bucket}/{key:path}", response_model=ObjectResponse, status_code=status.HTTP_201_CREATED)
+async def put_object(bucket: str, key: str, request: Request, storage: ObjectStorage = Depends(get_storage)):
+    """Загрузка объекта потоком из тела запроса (без multipart и буферизации в памяти)"""
+    check_location(bucket, key)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Object too large")
+    content_type = safe_content_type(request.headers.get("content-type"))
+    try:
+        info, deduplicated = await storage.put_object(bucket, key, request.stream(), content_type, MAX_UPLOAD_BYTES)
+    except ObjectTooLarge:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Object too large")
+    return ObjectResponse(
+        bucket=info.bucket,
+        key=info.key,
+        size=info.size,
+        sha256=info.sha256,
+        content_type=info.content_type,
+        deduplicated=deduplicated
+    )
+
+@router.api_route("/objects/{bucket}/{key:path}", methods=["GET", "HEAD"])
+async def get_object(bucket: str, key: str, storage: ObjectStorage = Depends(get_storage)):
+    """Скачивание объекта; поддерживаются Range и If-Range"""
+    check_location(bucket, key)
+    info = storage.head_object(bucket, key)
+    if info is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Object not found")
+    # Тип проверяется и при отдаче (объекты, загруженные до списка SAFE_CONTENT_TYPES); inline -
+    # только картинки, остальное скачивается, и ни один ответ не исполняется на origin gateway
+    media_type = safe_content_type(info.content_type)
+    return SendfileResponse(
+        storage.object_path(info),
+        media_type=media_type,
+        headers={
+            "etag": info.etag,
+            "x-content-type-options": "nosniff",
+            "content-security-policy": "default-src 'none'; sandbox",
+        },
+        content_disposition_type="inline" if media_type.startswith("image/") else "attachment",
+        filename=os.path.basename(key)
+    )
+
+@router.delete("/objects/{bucket}/{key:path}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_object(bucket: str, key: str, storage: ObjectStorage = Depends(get_storage)):
+    """Удаление объекта"""
+    check_location(bucket, key)
+    if not storage.delete_object(bucket, key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Object not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,42 @@
+from starlette.responses import FileResponse
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+class SendfileResponse(FileResponse):
+    """FileResponse с отдачей через sendfile, если ASGI-сервер поддерживает расширение zerocopysend.
+
+    Заголовки Range/If-Range, ETag и 206/416 обрабатывает FileResponse. Без расширения
+    (uvicorn) файл читается крупными блоками, не целиком в память.
+    """
+
+    chunk_size = 1024 * 1024
+
+    async def __call__(self, scope, receive, send):
+        self._zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+        await super().__call__(scope, receive, send)
+
+    async def _sendfile(self, send, offset: int, count: int):
+        with open(self.path, "rb") as file:
+            await send({
+                "type": ZEROCOPY_EXTENSION,
+                "file": file,
+                "offset": offset,
+                "count": count,
+                "more_body": False,
+            })
+
+    async def _handle_simple(self, send, send_header_only: bool):
+        if not self._zerocopy or send_header_only:
+            await super()._handle_simple(send, send_header_only)
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await self._sendfile(send, 0, int(self.headers["content-length"]))
+
+    async def _handle_single_range(self, send, start: int, end: int, file_size: int, send_header_only: bool):
+        if not self._zerocopy or send_header_only:
+            await super()._handle_single_range(send, start, end, file_size, send_header_only)
+            return
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        await self._sendfile(send, start, end - start)
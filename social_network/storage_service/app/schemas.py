@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+class ObjectResponse(BaseModel):
+    bucket: str
+    key: str
+    size: int
+    sha256: str
+    content_type: str
+    deduplicated: bool = False
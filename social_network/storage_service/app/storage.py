@@ -0,0 +1,182 @@
+"""Хранилище файлов с интерфейсом в духе S3 (put/head/delete object).
+
+LocalDiskBackend - локальная замена объектного хранилища: содержимое хранится
+один раз по sha256 (blobs/ab/cd/<sha256>), объект - это JSON с метаданными
+(meta/<bucket>/<key>.json), указывающий на blob. Загрузка идет потоком:
+хеш считается по мере записи, поэтому одинаковые файлы не дублируются на диске,
+а память не зависит от размера файла.
+"""
+from abc import ABC, abstractmethod
+from typing import AsyncIterable, Optional
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import anyio
+
+# Content-Type задает загрузивший файл, поэтому сохраняются только типы, которые браузер
+# не исполняет (без text/html, SVG, XML); остальное хранится как application/octet-stream
+SAFE_CONTENT_TYPES = {
+    "image/png", "image/jpeg", "image/gif", "image/webp",
+    "application/pdf", "text/plain", "video/mp4", "audio/mpeg", "application/zip",
+}
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+KEY_PATTERN = re.compile(r"^[A-Za-z0-9_\-][A-Za-z0-9._\-]*(/[A-Za-z0-9_\-][A-Za-z0-9._\-]*)*$")
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+class ObjectTooLarge(Exception):
+    pass
+
+class ObjectInfo:
+    """Метаданные объекта"""
+
+    def __init__(self, bucket: str, key: str, size: int, sha256: str, content_type: str, uploaded_at: float):
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+        self.uploaded_at = uploaded_at
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"'
+
+    def to_dict(self) -> dict:
+        return {
+            "bucket": self.bucket,
+            "key": self.key,
+            "size": self.size,
+            "sha256": self.sha256,
+            "content_type": self.content_type,
+            "uploaded_at": self.uploaded_at,
+        }
+
+class ObjectStorage(ABC):
+    """Интерфейс хранилища; другие бэкенды (S3) реализуют те же методы"""
+
+    @abstractmethod
+    async def put_object(
+        self, bucket: str, key: str, chunks: AsyncIterable[bytes], content_type: str, max_size: int
+    ) -> tuple[ObjectInfo, bool]:
+        """Сохранение объекта из потока; возвращает метаданные и признак дедупликации"""
+
+    @abstractmethod
+    def head_object(self, bucket: str, key: str) -> Optional[ObjectInfo]:
+        pass
+
+    @abstractmethod
+    def delete_object(self, bucket: str, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def object_path(self, info: ObjectInfo) -> str:
+        """Путь к содержимому для отдачи файла без чтения в память"""
+
+def safe_content_type(content_type: Optional[str]) -> str:
+    """Тип из списка SAFE_CONTENT_TYPES (без параметров) или application/octet-stream"""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return media_type if media_type in SAFE_CONTENT_TYPES else DEFAULT_CONTENT_TYPE
+
+def validate_key(key: str) -> bool:
+    return len(key) <= 512 and KEY_PATTERN.match(key) is not None
+
+class LocalDiskBackend(ObjectStorage):
+    """Объекты на локальном диске с дедупликацией по sha256"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def _meta_path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, "meta", bucket, f"{key}.json")
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], sha256[2:4], sha256)
+
+    @staticmethod
+    def _write(file, digest, buffer: bytearray):
+        # hashlib и запись отпускают GIL, поэтому пачка обрабатывается в потоке без блокировки цикла событий
+        digest.update(buffer)
+        file.write(buffer)
+
+    async def put_object(self, bucket, key, chunks, content_type, max_size):
+        digest = hashlib.sha256()
+        size = 0
+        buffer = bytearray()
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb", buffering=0) as file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_size:
+                        raise ObjectTooLarge()
+                    buffer += chunk
+                    if len(buffer) >= WRITE_BUFFER_SIZE:
+                        data, buffer = buffer, bytearray()
+                        await anyio.to_thread.run_sync(self._write, file, digest, data)
+                if buffer:
+                    await anyio.to_thread.run_sync(self._write, file, digest, buffer)
+            sha256 = digest.hexdigest()
+            blob_path = self._blob_path(sha256)
+            deduplicated = os.path.exists(blob_path)
+            if deduplicated:
+                os.unlink(tmp_path)
+                # Свежий mtime защищает blob от collect_garbage до записи метаданных
+                os.utime(blob_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        info = ObjectInfo(bucket, key, size, sha256, content_type, time.time())
+        meta_path = self._meta_path(bucket, key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        # Атомарная замена: читатель видит либо старую, либо новую версию объекта
+        fd, tmp_meta = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "w") as file:
+            json.dump(info.to_dict(), file)
+        os.replace(tmp_meta, meta_path)
+        return info, deduplicated
+
+    def head_object(self, bucket, key):
+        try:
+            with open(self._meta_path(bucket, key)) as file:
+                return ObjectInfo(**json.load(file))
+        except FileNotFoundError:
+            return None
+
+    def delete_object(self, bucket, key):
+        """Удаляет только метаданные; blob может использоваться другими объектами (см. collect_garbage)"""
+        try:
+            os.unlink(self._meta_path(bucket, key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def object_path(self, info):
+        return self._blob_path(info.sha256)
+
+    def collect_garbage(self, grace_seconds: float = 3600) -> int:
+        """Удаление blob'ов без объектов; свежие пропускаются, чтобы не задеть идущие загрузки"""
+        referenced = set()
+        for directory, _, files in os.walk(os.path.join(self.root, "meta")):
+            for name in files:
+                with open(os.path.join(directory, name)) as file:
+                    referenced.add(json.load(file)["sha256"])
+        removed = 0
+        deadline = time.time() - grace_seconds
+        for directory, _, files in os.walk(os.path.join(self.root, "blobs")):
+            for name in files:
+                path = os.path.join(directory, name)
+                if name not in referenced and os.stat(path).st_mtime < deadline:
+                    os.unlink(path)
+                    removed += 1
+        return removed
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.handlers import get_storage
+from app.responses import SendfileResponse
+from app.storage import LocalDiskBackend, ObjectStorage, validate_key
+from app import handlers
+
+client = TestClient(app)
+
+def chunks(data: bytes, size: int = 1000):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path):
+    backend = LocalDiskBackend(str(tmp_path))
+    app.dependency_overrides[get_storage] = lambda: backend
+    yield backend
+    app.dependency_overrides.clear()
+
+class TestObjects:
+    """Тесты для загрузки и скачивания объектов"""
+
+    def test_streaming_upload_and_download(self, storage):
+        """Тест: тело приходит частями, хеш считается по мере записи"""
+        data = os.urandom(3 * 1024 * 1024 + 17)
+
+        response = client.put(
+            "/api/v1/objects/attachments/u1/report.bin",
+            content=chunks(data, 64 * 1024),
+            headers={"Content-Type": "application/pdf"}
+        )
+        download = client.get("/api/v1/objects/attachments/u1/report.bin")
+
+        assert response.status_code == 201
+        assert response.json()["sha256"] == hashlib.sha256(data).hexdigest()
+        assert response.json()["size"] == len(data)
+        assert download.content == data
+        assert download.headers["content-type"] == "application/pdf"
+        assert download.headers["etag"] == f'"{hashlib.sha256(data).hexdigest()}"'
+        assert os.listdir(storage.tmp_dir) == []
+
+    def test_deduplication(self, storage):
+        """Тест: одинаковое содержимое хранится на диске один раз"""
+        first = client.put("/api/v1/objects/avatars/a/avatar.png", content=b"same bytes")
+        second = client.put("/api/v1/objects/avatars/b/avatar.png", content=b"same bytes")
+
+        blobs = [name for _, _, files in os.walk(os.path.join(storage.root, "blobs")) for name in files]
+        assert first.json()["deduplicated"] is False
+        assert second.json()["deduplicated"] is True
+        assert blobs == [first.json()["sha256"]]
+
+    def test_range_requests(self):
+        """Тест: Range отдает часть файла с 206, недопустимый диапазон - 416"""
+        client.put("/api/v1/objects/attachments/u1/video.mp4", content=bytes(range(256)) * 4)
+
+        partial = client.get("/api/v1/objects/attachments/u1/video.mp4", headers={"Range": "bytes=10-19"})
+        suffix = client.get("/api/v1/objects/attachments/u1/video.mp4", headers={"Range": "bytes=-4"})
+        invalid = client.get("/api/v1/objects/attachments/u1/video.mp4", headers={"Range": "bytes=5000-"})
+
+        assert partial.status_code == 206
+        assert partial.content == bytes(range(10, 20))
+        assert partial.headers["content-range"] == "bytes 10-19/1024"
+        assert suffix.content == bytes(range(252, 256))
+        assert invalid.status_code == 416
+
+    def test_untrusted_content_type(self, storage):
+        """Тест: text/html не отдается как страница: octet-stream, attachment и nosniff"""
+        upload = client.put(
+            "/api/v1/objects/attachments/u1/page.html",
+            content=b"<script>alert(1)</script>", headers={"Content-Type": "text/html"}
+        )
+        client.put("/api/v1/objects/avatars/u1/me.png", content=b"png", headers={"Content-Type": "IMAGE/PNG; x=1"})
+        page = client.get("/api/v1/objects/attachments/u1/page.html")
+        avatar = client.get("/api/v1/objects/avatars/u1/me.png")
+
+        assert upload.json()["content_type"] == "application/octet-stream"
+        assert page.headers["content-type"] == "application/octet-stream"
+        assert page.headers["content-disposition"].startswith("attachment")
+        assert page.headers["x-content-type-options"] == "nosniff"
+        assert avatar.headers["content-type"] == "image/png"
+        assert avatar.headers["content-disposition"].startswith("inline")
+
+    def test_limits_and_validation(self, monkeypatch):
+        """Тест: размер ограничен, ключи с '..' и неизвестные bucket отклоняются"""
+        monkeypatch.setattr(handlers, "MAX_UPLOAD_BYTES", 100)
+
+        too_large = client.put("/api/v1/objects/attachments/big.bin", content=chunks(b"x" * 500, 50))
+        traversal = client.put("/api/v1/objects/attachments/a/../../etc/passwd", content=b"x")
+        bucket = client.put("/api/v1/objects/secrets/file.txt", content=b"x")
+
+        assert too_large.status_code == 413
+        assert traversal.status_code in (400, 404)
+        assert not validate_key("a/../b")
+        assert not validate_key("/etc/passwd")
+        assert validate_key("user1/photo.v2.png")
+        assert bucket.status_code == 404
+
+    def test_internal_token(self, monkeypatch):
+        """Тест: с STORAGE_INTERNAL_TOKEN запросы без токена gateway отклоняются"""
+        monkeypatch.setattr(handlers, "STORAGE_INTERNAL_TOKEN", "internal-secret")
+
+        anonymous = client.put("/api/v1/objects/avatars/a/avatar.png", content=b"x")
+        wrong = client.get("/api/v1/objects/avatars/a/avatar.png", headers={"X-Internal-Token": "guess"})
+        allowed = client.put(
+            "/api/v1/objects/avatars/a/avatar.png", content=b"x", headers={"X-Internal-Token": "internal-secret"}
+        )
+
+        assert anonymous.status_code == wrong.status_code == 403
+        assert allowed.status_code == 201
+
+    def test_storage_interface_is_abstract(self):
+        """Тест: бэкенд без реализации методов интерфейса не создается"""
+        class Incomplete(ObjectStorage):
+            def head_object(self, bucket, key):
+                return None
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_delete_and_garbage_collection(self, storage):
+        """Тест: после удаления объекта blob удаляется сборкой мусора"""
+        client.put("/api/v1/objects/avatars/u1/avatar.png", content=b"avatar")
+
+        assert client.delete("/api/v1/objects/avatars/u1/avatar.png").status_code == 204
+        assert client.get("/api/v1/objects/avatars/u1/avatar.png").status_code == 404
+        assert storage.collect_garbage(grace_seconds=3600) == 0
+        assert storage.collect_garbage(grace_seconds=-1) == 1
+
+class TestSendfileResponse:
+    """Тесты для отдачи файла через расширение zerocopysend"""
+
+    @pytest.mark.asyncio
+    async def test_zerocopy_range(self, tmp_path):
+        """Тест: при поддержке сервером файл передается дескриптором, без чтения в процесс"""
+        path = tmp_path / "file.bin"
+        path.write_bytes(b"0123456789")
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.zerocopysend":
+                message = {**message, "file": message["file"].name}
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "headers": [(b"range", b"bytes=2-5")],
+            "extensions": {"http.response.zerocopysend": {}},
+        }
+        await SendfileResponse(str(path))(scope, receive, send)
+
+        assert messages[0]["status"] == 206
+        assert messages[1] == {
+            "type": "http.response.zerocopysend", "file": str(path), "offset": 2, "count": 4, "more_body": False
+        }
@@ -1,41 +1,82 @@
-from passlib.context import CryptContext
-from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi import HTTPException, status
 import os
+import secrets
+from .tracing import traced
+from .metrics import PASSWORD_HASH_DURATION
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib и jose (вместе с cryptography) импортируются при первом использовании:
+# это заметная часть времени запуска воркера, а нужны они только login/register
+_pwd_context = None
+
+def get_pwd_context():
+    """CryptContext с bcrypt; backend bcrypt загружается при первом хешировании"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Ключ для административных эндпоинтов; без него они отключены
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+# Права ролей; роль user есть у всех и в токен не записывается
+ROLE_PERMISSIONS = {
+    "user": {"profile:read", "profile:write"},
+    "admin": {"roles:manage"},
+}
+DEFAULT_ROLE = "user"
+
+def permissions_for(roles) -> set[str]:
+    """Объединение прав роли user и перечисленных ролей"""
+    permissions = set(ROLE_PERMISSIONS[DEFAULT_ROLE])
+    for role in roles:
+        permissions |= ROLE_PERMISSIONS.get(role, set())
+    return permissions
 
+@traced("password.verify")
+@PASSWORD_HASH_DURATION.labels("verify").time()
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Проверка пароля"""
     if len(plain_password.encode('utf-8')) > 72:
         plain_password = plain_password[:72]
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
+@traced("password.hash")
+@PASSWORD_HASH_DURATION.labels("hash").time()
 def get_password_hash(password: str) -> str:
     """Хеширование пароля"""
     if len(password.encode('utf-8')) > 72:
         password = password[:72]
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    """Создание JWT токена"""
+@traced("jwt.encode")
+def create_access_token(
+    data: dict, expires_delta: timedelta = None, roles: list[str] = None, role_version: int = None
+):
+    """Создание JWT токена; роли и их версия записываются в компактные claims roles/rv"""
     to_encode = data.copy()
+    if roles:
+        to_encode["roles"] = sorted(roles)
+    if role_version is not None:
+        to_encode["rv"] = role_version
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str):
-    """Проверка JWT токена"""
+@traced("jwt.decode")
+def decode_token(token: str) -> dict:
+    """Проверка JWT токена; возвращает все claims"""
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -45,10 +86,22 @@ def verify_token(token: str):
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return username
+        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+def verify_token(token: str):
+    """Проверка JWT токена"""
+    return decode_token(token)["sub"]
+
+def verify_admin_key(api_key: str):
+    """Проверка ключа администратора"""
+    if not ADMIN_API_KEY or not api_key or not secrets.compare_digest(api_key, ADMIN_API_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
@@ -0,0 +1,221 @@
+"""Массовый импорт пользователей из CSV/NDJSON.
+
+Пароли хешируются в пуле процессов, пока предыдущая пачка загружается в БД;
+в PostgreSQL пачка загружается через COPY во временную таблицу, в SQLite -
+многострочным INSERT. Существующие username/email попадают в отчет
+как конфликты, а не прерывают импорт.
+
+Запуск: python -m app.bulk_import users.csv --format csv
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from pydantic import ValidationError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from .auth import get_password_hash
+from .models import User, get_engine
+from .schemas import ImportUserRecord, ImportIssue, ImportProgress
+
+COLUMNS = ("username", "email", "password_hash", "first_name", "last_name", "birth_date", "phone")
+MAX_SAMPLES = 100
+# Процессов хеширования для импорта через HTTP: один пул на воркер сервиса, общий для всех импортов
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+_import_pool: Optional[ProcessPoolExecutor] = None
+_import_pool_lock = threading.Lock()
+
+STAGING_TABLE_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS users_import (
+    username VARCHAR(50),
+    email VARCHAR(100),
+    password_hash VARCHAR(255),
+    first_name VARCHAR(50),
+    last_name VARCHAR(50),
+    birth_date DATE,
+    phone VARCHAR(20)
+) ON COMMIT DELETE ROWS
+"""
+
+def iter_records(lines: Iterable[str], fmt: str) -> Iterator[tuple[int, object]]:
+    """(номер строки, dict или текст ошибки разбора) без чтения всего файла в память"""
+    if fmt == "csv":
+        for line_number, row in enumerate(csv.DictReader(lines), start=2):
+            yield line_number, row
+        return
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        yield line_number, record if isinstance(record, dict) else "Expected a JSON object"
+
+def prepare_row(item: tuple[int, object]) -> tuple[int, Optional[dict], Optional[str]]:
+    """Валидация и хеширование одной записи; выполняется в процессе пула"""
+    line_number, record = item
+    if isinstance(record, str):
+        return line_number, None, record
+    try:
+        data = ImportUserRecord.model_validate(
+            {key: value for key, value in record.items() if isinstance(key, str) and value not in ("", None)}
+        )
+    except ValidationError as e:
+        detail = "; ".join(
+            f"{'.'.join(str(loc) for loc in error['loc']) or 'record'}: {error['msg']}"
+            for error in e.errors()
+        )
+        return line_number, None, detail
+    row = data.model_dump(include=set(COLUMNS))
+    row["password_hash"] = data.password_hash or get_password_hash(data.password)
+    return line_number, row, None
+
+def insert_rows(engine: Engine, rows: list[dict]) -> set[str]:
+    """Вставка пачки с пропуском конфликтов; возвращает username вставленных строк.
+
+    PostgreSQL - COPY во временную таблицу, SQLite (тесты, локальный запуск) - INSERT ... ON CONFLICT.
+    """
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow(["" if row[column] is None else row[column] for column in COLUMNS])
+            buffer.seek(0)
+            columns = ", ".join(COLUMNS)
+            cursor = conn.connection.cursor()
+            cursor.execute(STAGING_TABLE_SQL)
+            cursor.copy_expert(f"COPY users_import ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(
+                f"INSERT INTO users ({columns}) SELECT {columns} FROM users_import "
+                "ON CONFLICT DO NOTHING RETURNING username"
+            )
+            return {username for (username,) in cursor.fetchall()}
+        result = conn.execute(
+            sqlite_insert(User).values(rows).on_conflict_do_nothing().returning(User.username)
+        )
+        return set(result.scalars())
+
+def add_issue(samples: list[ImportIssue], line_number: int, username: Optional[str], detail: str):
+    if len(samples) < MAX_SAMPLES:
+        samples.append(ImportIssue(line=line_number, username=username, detail=detail))
+
+def load_batch(engine: Engine, prepared: Iterable, progress: ImportProgress):
+    rows, lines = [], []
+    usernames, emails = set(), set()
+    for line_number, row, error in prepared:
+        progress.processed += 1
+        if error is not None:
+            progress.errors += 1
+            add_issue(progress.error_samples, line_number, None, error)
+            continue
+        # Без учета регистра, как уникальные индексы users
+        username, email = row["username"].lower(), row["email"].lower()
+        if username in usernames or email in emails:
+            progress.conflicts += 1
+            add_issue(progress.conflict_samples, line_number, row["username"], "Duplicate in import")
+            continue
+        usernames.add(username)
+        emails.add(email)
+        rows.append(row)
+        lines.append(line_number)
+    if not rows:
+        return
+    inserted = insert_rows(engine, rows)
+    progress.inserted += len(inserted)
+    for line_number, row in zip(lines, rows):
+        if row["username"] not in inserted:
+            progress.conflicts += 1
+            add_issue(progress.conflict_samples, line_number, row["username"], "Username or email already exists")
+
+def get_import_pool() -> Optional[ProcessPoolExecutor]:
+    """Пул хеширования для импорта внутри сервиса (None при IMPORT_WORKERS=0).
+
+    Процессы запускаются через spawn: fork многопоточного воркера uvicorn может унаследовать
+    захваченные другими потоками блокировки.
+    """
+    global _import_pool
+    if _import_pool is None and IMPORT_WORKERS > 0:
+        with _import_pool_lock:
+            if _import_pool is None:
+                _import_pool = ProcessPoolExecutor(IMPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _import_pool
+
+def import_users(
+    lines: Iterable[str],
+    fmt: str,
+    engine: Engine,
+    batch_size: int = 1000,
+    workers: Optional[int] = None,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> Iterator[ImportProgress]:
+    """Импорт пачками; после каждой пачки отдает текущий прогресс, в конце - done=True.
+
+    pool - общий пул хеширования (не закрывается после импорта); без него создается
+    собственный пул на workers процессов: 0 - хеширование в текущем процессе, None - по числу ядер.
+    """
+    progress = ImportProgress()
+    records = iter_records(lines, fmt)
+    own_pool = pool is None
+    if own_pool:
+        workers = os.cpu_count() if workers is None else workers
+        pool = ProcessPoolExecutor(workers) if workers > 0 else None
+    else:
+        workers = pool._max_workers
+
+    def submit(batch):
+        if pool is None:
+            return map(prepare_row, batch)
+        # Executor.map ставит всю пачку в очередь сразу, пока загружается предыдущая
+        return pool.map(prepare_row, batch, chunksize=max(1, len(batch) // (workers * 4)))
+
+    try:
+        pending = None
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            prepared = submit(batch)
+            if pending is not None:
+                load_batch(engine, pending, progress)
+                yield progress
+            pending = prepared
+        if pending is not None:
+            load_batch(engine, pending, progress)
+    finally:
+        if own_pool and pool is not None:
+            pool.shutdown(cancel_futures=True)
+    progress.done = True
+    yield progress
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or NDJSON")
+    parser.add_argument("path", help="Input file, '-' for stdin")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8", newline="")
+    with source:
+        for progress in import_users(source, fmt, get_engine(), args.batch_size, args.workers):
+            print(
+                f"processed={progress.processed} inserted={progress.inserted} "
+                f"conflicts={progress.conflicts} errors={progress.errors}",
+                file=sys.stderr
+            )
+    print(progress.model_dump_json(indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from typing import Literal, Optional
 from .schemas import (
     RegisterRequest, LoginRequest, ProfileUpdateRequest, 
-    UserResponse, TokenResponse, MessageResponse
+    UserResponse, TokenResponse, MessageResponse,
+    RolesUpdateRequest, UserRolesResponse, RoleVersionResponse
 )
-from .models import get_db, User
+from .models import get_db, get_read_db, use_primary_if_recent_write, mark_recent_write, User
 from .auth import (
     verify_password, get_password_hash, create_access_token, 
-    verify_token, ACCESS_TOKEN_EXPIRE_MINUTES
+    decode_token, verify_admin_key, ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from . import queries
+from .throttling import login_throttle, get_client_ip
+from .roles import Principal, require_permission, set_user_roles, load_role_version
+from .protocol import MsgPackRoute, NegotiatedResponse, serialize_response
 from datetime import timedelta
+from pydantic import TypeAdapter
+import io
+import math
+import tempfile
 
-router = APIRouter()
+router = APIRouter(route_class=MsgPackRoute, default_response_class=NegotiatedResponse)
+
+# Ответы горячих маршрутов сериализуются в обработчике (serialize_response), а не FastAPI
+TOKEN_RESPONSE = TypeAdapter(TokenResponse)
+USER_RESPONSE = TypeAdapter(UserResponse)
+USER_LIST_RESPONSE = TypeAdapter(list[UserResponse])
 security = HTTPBearer()
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+def commit_identity(db: Session):
+    """commit с ответом 400, если параллельный запрос успел занять тот же username/email
+    (в том числе в другом регистре - это проверяют индексы lower(...))"""
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already exists"
+        )
 
 @router.post("/register", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     """Регистрация нового пользователя"""
-    existing_user = db.query(User).filter(
-        or_(User.username == request.username, User.email == request.email)
-    ).first()
+    # Сравнение без учета регистра, как в уникальных индексах lower(username)/lower(email)
+    existing_user = db.query(User).filter(or_(
+        func.lower(User.username) == func.lower(request.username),
+        func.lower(User.email) == func.lower(request.email)
+    )).first()
     
     if existing_user:
-        if existing_user.username == request.username:
+        if existing_user.username.lower() == request.username.lower():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already exists"
@@ -42,43 +75,56 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
+    commit_identity(db)
     db.refresh(new_user)
+    mark_recent_write(new_user.username, new_user.email)
     
     return MessageResponse(message="User registered successfully")
 
 @router.post("/login", response_model=TokenResponse)
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: LoginRequest, http_request: Request, db: Session = Depends(get_read_db)):
     """Аутентификация пользователя"""
-    user = db.query(User).filter(
-        or_(User.username == request.username, User.email == request.username)
-    ).first()
+    # Дешевая проверка до обращения к БД и bcrypt: защита CPU от перебора паролей
+    client_ip = get_client_ip(http_request)
+    retry_after = login_throttle.check(request.username, client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    use_primary_if_recent_write(db, request.username)
+    user = queries.get_login_user(db, request.username)
     
-    if not user or not verify_password(request.password, user.password_hash):
+    if not user or not verify_password(request.password, user.pop("password_hash")):
+        login_throttle.record_failure(request.username, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_throttle.record_success(request.username)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user["username"], "uid": user["id"]},
+        expires_delta=access_token_expires,
+        roles=user.pop("roles"),
+        role_version=user.pop("roles_version")
     )
     
-    return TokenResponse(
-        access_token=access_token,
-        token_type="bearer",
-        user=UserResponse.model_validate(user)
+    return serialize_response(
+        TOKEN_RESPONSE, {"access_token": access_token, "token_type": "bearer", "user": user}
     )
 
 @router.get("/profile", response_model=UserResponse)
 async def get_profile(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(require_permission("profile:read")),
+    db: Session = Depends(get_read_db)
 ):
     """Получение профиля текущего пользователя"""
-    username = verify_token(credentials.credentials)
-    user = db.query(User).filter(User.username == username).first()
+    username = principal.username
+    use_primary_if_recent_write(db, username)
+    user = queries.get_profile(db, username)
     
     if not user:
         raise HTTPException(
@@ -86,16 +132,16 @@ async def get_profile(
             detail="User not found"
         )
     
-    return UserResponse.model_validate(user)
+    return serialize_response(USER_RESPONSE, user)
 
 @router.put("/profile", response_model=UserResponse)
 async def update_profile(
     request: ProfileUpdateRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    principal: Principal = Depends(require_permission("profile:write")),
     db: Session = Depends(get_db)
 ):
     """Обновление профиля пользователя"""
-    username = verify_token(credentials.credentials)
+    username = principal.username
     user = db.query(User).filter(User.username == username).first()
     
     if not user:
@@ -107,13 +153,83 @@ async def update_profile(
     for field, value in update_data.items():
         setattr(user, field, value)
     
-    db.commit()
+    commit_identity(db)
     db.refresh(user)
+    mark_recent_write(user.username, user.email)
     
-    return UserResponse.model_validate(user)
+    return serialize_response(USER_RESPONSE, user)
 
 @router.get("/users", response_model=list[UserResponse])
-async def get_users(db: Session = Depends(get_db)):
+async def get_users(db: Session = Depends(get_read_db)):
     """Получение списка всех пользователей (для тестирования)"""
-    users = db.query(User).all()
-    return [UserResponse.model_validate(user) for user in users]
+    return serialize_response(USER_LIST_RESPONSE, queries.get_profiles(db))
+
+@router.put("/admin/users/{username}/roles", response_model=UserRolesResponse)
+async def update_roles(
+    username: str,
+    request: RolesUpdateRequest,
+    principal: Principal = Depends(require_permission("roles:manage")),
+    db: Session = Depends(get_db)
+):
+    """Замена ролей пользователя; ранее выданные токены пользователя перестают действовать"""
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    user = set_user_roles(db, user, request.roles)
+    # Следующий вход пользователя должен прочитать новые роли из primary
+    mark_recent_write(user.username, user.email)
+    return UserRolesResponse(
+        id=user.id, username=user.username, roles=user.role_names, roles_version=user.roles_version
+    )
+
+@router.get("/roles/version", response_model=RoleVersionResponse)
+async def get_role_version(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
+    """Текущая версия ролей владельца токена (для кэша версий в gateway)"""
+    claims = decode_token(credentials.credentials)
+    version = load_role_version(db, claims["uid"]) if "uid" in claims else None
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return RoleVersionResponse(user_id=claims["uid"], roles_version=version)
+
+@router.post("/admin/import")
+async def import_users_endpoint(
+    request: Request,
+    format: Literal["csv", "ndjson"] = "ndjson",
+    batch_size: int = Query(1000, ge=1, le=10000),
+    x_admin_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Массовый импорт пользователей; прогресс отдается потоком NDJSON"""
+    verify_admin_key(x_admin_key)
+    # Импорт с пулом процессов нужен редко, поэтому модуль загружается при первом вызове
+    from .bulk_import import import_users, get_import_pool
+    engine = db.get_bind()
+    # Тело сохраняется на диск блоками по SPOOL_BLOCK_SIZE, чтобы память не зависела от размера
+    # файла; запись на диск - в пуле потоков, чтобы не останавливать event loop
+    upload = await run_in_threadpool(tempfile.TemporaryFile)
+    block = bytearray()
+    async for chunk in request.stream():
+        block += chunk
+        if len(block) >= SPOOL_BLOCK_SIZE:
+            await run_in_threadpool(upload.write, bytes(block))
+            block.clear()
+    await run_in_threadpool(upload.write, bytes(block))
+    upload.seek(0)
+    # Без общего пула (IMPORT_WORKERS=0) пароли хешируются в потоке ответа
+    pool = get_import_pool()
+
+    def progress_lines():
+        with io.TextIOWrapper(upload, encoding="utf-8", newline="") as lines:
+            for progress in import_users(lines, format, engine, batch_size=batch_size, workers=0, pool=pool):
+                yield progress.model_dump_json() + "\n"
+
+    return StreamingResponse(progress_lines(), media_type="application/x-ndjson")
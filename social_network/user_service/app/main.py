@@ -1,24 +1,54 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from .handlers import router
+from contextlib import asynccontextmanager
+from .startup import startup_profile, warm_up, STARTUP_WARMUP
 
-app = FastAPI(
-    title="User Service",
-    description="Сервис для управления пользователями, регистрации и аутентификации",
-    version="1.0.0"
-)
+# Этапы импорта замеряются отдельно: отчет - python -m app.startup, метрика startup_stage_seconds
+with startup_profile.stage("import fastapi"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+with startup_profile.stage("import app.models (sqlalchemy)"):
+    from . import models  # noqa: F401
+with startup_profile.stage("import app.schemas (pydantic)"):
+    from . import schemas  # noqa: F401
+with startup_profile.stage("import app.handlers"):
+    from .handlers import router
+    from .tracing import TracingMiddleware
+    from .replicas import PrimaryUntilMiddleware
+    from .metrics import MetricsMiddleware, metrics_response
 
-# Настройка CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if STARTUP_WARMUP:
+        warm_up()
+    startup_profile.finish()
+    yield
 
-app.include_router(router, prefix="/api/v1")
+with startup_profile.stage("create app"):
+    app = FastAPI(
+        title="User Service",
+        description="Сервис для управления пользователями, регистрации и аутентификации",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+
+    # Настройка CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(PrimaryUntilMiddleware, max_window=models.PRIMARY_STICKINESS_SECONDS)
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+
+    app.include_router(router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
-    return {"message": "User Service API", "version": "1.0.0"}
\ No newline at end of file
+    return {"message": "User Service API", "version": "1.0.0"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    return metrics_response()
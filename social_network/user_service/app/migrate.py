@@ -0,0 +1,20 @@
+"""Миграция схемы user_service: таблицы, новые столбцы и индексы lower(username)/lower(email).
+
+Запуск до старта сервиса (в Dockerfile - перед uvicorn): python -m app.migrate
+Повторный запуск безопасен: уже примененные шаги пропускаются.
+"""
+import sys
+from .models import create_tables, get_engine
+
+def main():
+    engine = get_engine()
+    try:
+        create_tables(engine)
+    except RuntimeError as e:
+        # Дубликаты без учета регистра: индекс не создан, нужен ручной разбор аккаунтов
+        print(f"migration failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"migrated {engine.url.render_as_string(hide_password=True)}")
+
+if __name__ == "__main__":
+    main()
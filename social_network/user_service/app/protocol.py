@@ -0,0 +1,60 @@
+from contextvars import ContextVar
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+import msgpack
+from .tracing import start_span
+
+# Компактный формат для внутренних вызовов из gateway; внешние клиенты получают JSON
+MSGPACK = "application/x-msgpack"
+
+_use_msgpack: ContextVar[bool] = ContextVar("use_msgpack", default=False)
+
+class NegotiatedResponse(JSONResponse):
+    """JSON по умолчанию, msgpack - если клиент прислал Accept: application/x-msgpack"""
+
+    def render(self, content) -> bytes:
+        if _use_msgpack.get():
+            self.media_type = MSGPACK
+            return msgpack.packb(content)
+        return super().render(content)
+
+def serialize_response(adapter: TypeAdapter, content, status_code: int = 200) -> NegotiatedResponse:
+    """Проверка по response_model и рендеринг JSON/msgpack внутри span serialize.
+
+    Готовый Response FastAPI отдает как есть, поэтому span охватывает всю сериализацию,
+    а не только model_validate.
+    """
+    with start_span("serialize"):
+        data = adapter.dump_python(adapter.validate_python(content), mode="json")
+        return NegotiatedResponse(data, status_code=status_code)
+
+class MsgPackRequest(Request):
+    """Запрос с телом в msgpack: FastAPI видит его как JSON и получает уже разобранные данные"""
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            self._json = msgpack.unpackb(await self.body())
+        return self._json
+
+class MsgPackRoute(APIRoute):
+    """Маршрут, понимающий msgpack в теле запроса и в Accept"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            if request.headers.get("content-type", "").startswith(MSGPACK):
+                headers = [
+                    (key, b"application/json") if key == b"content-type" else (key, value)
+                    for key, value in request.scope["headers"]
+                ]
+                request = MsgPackRequest({**request.scope, "headers": headers}, request.receive)
+            token = _use_msgpack.set(MSGPACK in request.headers.get("accept", ""))
+            try:
+                return await handler(request)
+            finally:
+                _use_msgpack.reset(token)
+
+        return route_handler
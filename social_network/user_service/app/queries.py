@@ -0,0 +1,75 @@
+"""Готовые Core-запросы для горячих путей чтения.
+
+Запросы выбирают только нужные столбцы и возвращают строки как словари для
+response_model: без ORM-объектов, identity map и model_validate на каждую
+строку. Операторы собираются один раз при импорте, поэтому SQLAlchemy берет
+скомпилированный SQL из кэша по ключу оператора.
+"""
+from typing import Optional
+from sqlalchemy import String, bindparam, func, select
+from sqlalchemy.orm import Session
+from .models import User, UserRole
+
+# Поля UserResponse; password_hash читается только при входе
+PROFILE_COLUMNS = (
+    User.id,
+    User.username,
+    User.email,
+    User.first_name,
+    User.last_name,
+    User.birth_date,
+    User.phone,
+    User.created_at,
+    User.updated_at,
+)
+
+PROFILE_BY_USERNAME = select(*PROFILE_COLUMNS).where(User.username == bindparam("username"))
+
+ALL_PROFILES = select(*PROFILE_COLUMNS)
+
+def login_by(column):
+    """Пользователь и его роли за один запрос: по строке на роль (или одна строка с role = NULL).
+
+    Условие lower(столбец) = lower(:identifier) совпадает с выражением индекса
+    ix_users_*_lower, поэтому поиск идет по одному индексу, без BitmapOr по двум.
+    """
+    return (
+        select(*PROFILE_COLUMNS, User.password_hash, User.roles_version, UserRole.role)
+        .outerjoin(UserRole, UserRole.user_id == User.id)
+        .where(func.lower(column) == func.lower(bindparam("identifier", type_=String)))
+    )
+
+LOGIN_BY_USERNAME = login_by(User.username)
+LOGIN_BY_EMAIL = login_by(User.email)
+
+def get_profile(db: Session, username: str) -> Optional[dict]:
+    row = db.execute(PROFILE_BY_USERNAME, {"username": username}).mappings().first()
+    return dict(row) if row is not None else None
+
+def get_profiles(db: Session) -> list[dict]:
+    return [dict(row) for row in db.execute(ALL_PROFILES).mappings()]
+
+def fetch_login_user(db: Session, statement, identifier: str) -> Optional[dict]:
+    user = None
+    for row in db.execute(statement, {"identifier": identifier}).mappings():
+        if user is None:
+            user = {key: value for key, value in row.items() if key != "role"}
+            user["roles"] = []
+        if row["role"] is not None:
+            user["roles"].append(row["role"])
+    if user is not None:
+        user["roles"].sort()
+    return user
+
+def get_login_user(db: Session, identifier: str) -> Optional[dict]:
+    """Профиль с password_hash, roles_version и списком ролей по username или email без учета регистра.
+
+    Идентификатор с '@' ищется по email, остальные - по username. Username с '@' больше
+    не регистрируются, но могли остаться от старых записей, поэтому при промахе по email
+    выполняется поиск по username.
+    """
+    if "@" in identifier:
+        user = fetch_login_user(db, LOGIN_BY_EMAIL, identifier)
+        if user is not None:
+            return user
+    return fetch_login_user(db, LOGIN_BY_USERNAME, identifier)
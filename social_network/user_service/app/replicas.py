@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from typing import Optional
+import itertools
+import math
+import threading
+import time
+
+class ReplicaRouter:
+    """Выбор реплики для чтения: round-robin по здоровым репликам, иначе primary"""
+
+    def __init__(self, primary: Engine, replicas: list[Engine], retry_seconds: float = 30.0):
+        self.primary = primary
+        self.replicas = replicas
+        self.retry_seconds = retry_seconds
+        self._unhealthy_until: dict[Engine, float] = {}
+        self._counter = itertools.count()
+        for replica in replicas:
+            self._watch(replica)
+
+    def _watch(self, replica: Engine):
+        @event.listens_for(replica, "handle_error")
+        def handle_error(context):
+            if context.is_disconnect or context.connection is None:
+                self.mark_unhealthy(replica)
+
+    def mark_unhealthy(self, replica: Engine):
+        self._unhealthy_until[replica] = time.monotonic() + self.retry_seconds
+
+    def is_healthy(self, replica: Engine) -> bool:
+        until = self._unhealthy_until.get(replica)
+        return until is None or until <= time.monotonic()
+
+    def choose(self) -> Engine:
+        if not self.replicas:
+            return self.primary
+        start = next(self._counter)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if self.is_healthy(replica):
+                return replica
+        return self.primary
+
+class RecentWrites:
+    """Окно привязки к primary для ключей (username/email), недавно изменивших данные"""
+
+    def __init__(self, window_seconds: float = 5.0, max_keys: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._expires: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark(self, *keys: str):
+        expires = time.monotonic() + self.window_seconds
+        with self._lock:
+            for key in keys:
+                self._expires[key] = expires
+                self._expires.move_to_end(key)
+            while len(self._expires) > self.max_keys:
+                self._expires.popitem(last=False)
+
+    def is_recent(self, key: str) -> bool:
+        with self._lock:
+            expires = self._expires.get(key)
+            if expires is None:
+                return False
+            if expires <= time.monotonic():
+                del self._expires[key]
+                return False
+            return True
+
+# Read-your-writes между воркерами и экземплярами: после записи ответ несет X-Primary-Until
+# (unix-время), gateway возвращает его клиенту в cookie и передает в следующих запросах
+PRIMARY_UNTIL_HEADER = "x-primary-until"
+_primary_until: ContextVar[Optional[dict]] = ContextVar("primary_until", default=None)
+
+def parse_primary_until(value: Optional[str], max_window: float) -> float:
+    """Отметка не дальше now + max_window: значение от клиента не может закрепить его за primary надолго"""
+    try:
+        until = float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+    if not math.isfinite(until):
+        return 0.0
+    return min(until, time.time() + max_window)
+
+class PrimaryUntilMiddleware:
+    """Принимает X-Primary-Until запроса и добавляет в ответ новую отметку после записи"""
+
+    def __init__(self, app, max_window: float = 5.0):
+        self.app = app
+        self.max_window = max_window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        value = dict(scope["headers"]).get(PRIMARY_UNTIL_HEADER.encode(), b"").decode("latin-1")
+        state = {"until": parse_primary_until(value, self.max_window), "marked": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state["marked"]:
+                marker = (PRIMARY_UNTIL_HEADER.encode(), f"{state['until']:.3f}".encode())
+                message = {**message, "headers": [*message.get("headers", []), marker]}
+            await send(message)
+
+        token = _primary_until.set(state)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _primary_until.reset(token)
+
+def mark_primary_until(window_seconds: float):
+    """Чтения этого клиента window_seconds секунд идут в primary (на любом воркере)"""
+    state = _primary_until.get()
+    if state is not None:
+        state["until"] = max(state["until"], time.time() + window_seconds)
+        state["marked"] = True
+
+def primary_until_active() -> bool:
+    state = _primary_until.get()
+    return state is not None and state["until"] > time.time()
+
+class RoutingSession(Session):
+    """Сессия для чтения: SELECT идут в реплику, flush и use_primary() - в primary"""
+
+    def __init__(self, router: Optional[ReplicaRouter] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.router = router
+
+    def use_primary(self):
+        self.info["use_primary"] = True
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.router is None:
+            return super().get_bind(mapper, clause, **kwargs)
+        if self.info.get("use_primary") or self._flushing:
+            return self.router.primary
+        if "replica" not in self.info:
+            self.info["replica"] = self.router.choose()
+        return self.info["replica"]
+
+    def execute(self, statement, *args, **kwargs):
+        try:
+            return super().execute(statement, *args, **kwargs)
+        except OperationalError as e:
+            replica = self.info.get("replica")
+            if (
+                self.router is None
+                or self.info.get("use_primary")
+                or replica is None
+                or replica is self.router.primary
+                or self.new or self.dirty or self.deleted
+            ):
+                raise
+            # Только потеря соединения (реплику уже исключил handle_error); таймаут запроса,
+            # конфликт с восстановлением WAL и т.п. - ошибка этого запроса, а не реплики
+            if self.router.is_healthy(replica) and not e.connection_invalidated:
+                raise
+            # Реплика недоступна: повторяем чтение на primary
+            self.router.mark_unhealthy(replica)
+            self.rollback()
+            self.use_primary()
+            return super().execute(statement, *args, **kwargs)
@@ -0,0 +1,146 @@
+"""Роли пользователей и проверка прав по claims токена.
+
+Роли записываются в токен при входе (claims roles и rv), поэтому проверка прав
+не обращается к БД. Чтобы отозванные роли не действовали до истечения токена,
+rv сравнивается с версией ролей пользователя из небольшого кэша с TTL.
+
+Выдача ролей: python -m app.roles alice admin moderator
+"""
+from collections import OrderedDict
+from typing import Callable, Optional
+import argparse
+import os
+import threading
+import time
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from .auth import ROLE_PERMISSIONS, DEFAULT_ROLE, decode_token, permissions_for
+from .models import SessionLocal, get_db, get_engine, User, UserRole
+
+ROLE_VERSION_TTL_SECONDS = float(os.getenv("ROLE_VERSION_TTL_SECONDS", "30"))
+
+security = HTTPBearer()
+
+class RoleVersionCache:
+    """Версии ролей по id пользователя с TTL и LRU-ограничением числа ключей"""
+
+    def __init__(self, ttl_seconds: float = 30.0, max_keys: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._versions: OrderedDict[int, tuple[int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, load: Callable[[], Optional[int]]) -> Optional[int]:
+        """Версия из кэша; при промахе или истечении TTL - из load()"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(user_id)
+            if cached is not None and cached[1] > now:
+                self._versions.move_to_end(user_id)
+                return cached[0]
+        version = load()
+        if version is not None:
+            self.set(user_id, version)
+        return version
+
+    def set(self, user_id: int, version: int):
+        with self._lock:
+            self._versions[user_id] = (version, time.monotonic() + self.ttl_seconds)
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > self.max_keys:
+                self._versions.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+
+role_versions = RoleVersionCache(ttl_seconds=ROLE_VERSION_TTL_SECONDS)
+
+class Principal:
+    """Пользователь запроса по данным токена"""
+
+    def __init__(self, user_id: Optional[int], username: str, roles: list[str], role_version: int):
+        self.user_id = user_id
+        self.username = username
+        self.roles = roles
+        self.role_version = role_version
+        self.permissions = permissions_for(roles)
+
+    def has(self, permission: str) -> bool:
+        return permission in self.permissions
+
+def load_role_version(db: Session, user_id: int) -> Optional[int]:
+    return db.execute(select(User.roles_version).where(User.id == user_id)).scalar_one_or_none()
+
+def require_permission(permission: str):
+    """Зависимость FastAPI: пользователь из токена с проверкой права и версии ролей"""
+    if not any(permission in permissions for permissions in ROLE_PERMISSIONS.values()):
+        raise ValueError(f"Unknown permission: {permission}")
+
+    def dependency(
+        credentials: HTTPAuthorizationCredentials = Depends(security),
+        db: Session = Depends(get_db)
+    ) -> Principal:
+        claims = decode_token(credentials.credentials)
+        principal = Principal(claims.get("uid"), claims["sub"], claims.get("roles", []), claims.get("rv", 0))
+        # Токены без uid выданы до появления ролей и содержат только роль user
+        if principal.user_id is not None:
+            # Сессия открывает соединение только при промахе кэша
+            current = role_versions.get(principal.user_id, lambda: load_role_version(db, principal.user_id))
+            if current is None or principal.role_version < current:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token roles are outdated",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+        if not principal.has(permission):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Insufficient permissions"
+            )
+        return principal
+
+    return dependency
+
+def set_user_roles(db: Session, user: User, roles: list[str]) -> User:
+    """Замена ролей пользователя с увеличением версии ролей"""
+    unknown = set(roles) - set(ROLE_PERMISSIONS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown roles: {', '.join(sorted(unknown))}"
+        )
+    wanted = set(roles) - {DEFAULT_ROLE}
+    user.roles = [role for role in user.roles if role.role in wanted] + [
+        UserRole(role=role) for role in sorted(wanted - set(user.role_names))
+    ]
+    # Атомарное увеличение, чтобы параллельные изменения не потеряли версию
+    db.execute(
+        update(User).where(User.id == user.id).values(roles_version=User.roles_version + 1)
+    )
+    db.commit()
+    db.refresh(user)
+    role_versions.set(user.id, user.roles_version)
+    return user
+
+def main():
+    parser = argparse.ArgumentParser(description="Set user roles")
+    parser.add_argument("username")
+    parser.add_argument("roles", nargs="*", help="Roles to keep; empty list revokes all extra roles")
+    args = parser.parse_args()
+
+    get_engine()
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == args.username).first()
+        if user is None:
+            raise SystemExit(f"User {args.username} not found")
+        user = set_user_roles(db, user, args.roles)
+        print(f"{user.username}: roles={user.role_names} roles_version={user.roles_version}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
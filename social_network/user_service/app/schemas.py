@@ -1,9 +1,11 @@
-from pydantic import BaseModel, EmailStr, constr, Field
+from pydantic import BaseModel, EmailStr, constr, Field, model_validator
 from typing import Optional
 from datetime import date, datetime
 
 class RegisterRequest(BaseModel):
-    username: constr(min_length=3, max_length=50) = Field(..., description="Username (3-50 characters)")
+    username: constr(min_length=3, max_length=50, pattern=r"^[^@]+$") = Field(
+        ..., description="Username (3-50 characters, without '@')"
+    )
     password: constr(min_length=8, max_length=100) = Field(..., description="Password (8-100 characters)")
     email: EmailStr = Field(..., description="Valid email address")
 
@@ -38,3 +40,46 @@ class TokenResponse(BaseModel):
 
 class MessageResponse(BaseModel):
     message: str
+
+class RolesUpdateRequest(BaseModel):
+    roles: list[str] = Field(..., description="Roles to keep; user role is implicit")
+
+class UserRolesResponse(BaseModel):
+    id: int
+    username: str
+    roles: list[str]
+    roles_version: int
+
+class RoleVersionResponse(BaseModel):
+    user_id: int
+    roles_version: int
+
+class ImportUserRecord(BaseModel):
+    username: constr(min_length=3, max_length=50, pattern=r"^[^@]+$")
+    email: EmailStr
+    password: Optional[constr(min_length=8, max_length=100)] = None
+    password_hash: Optional[constr(pattern=r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")] = None
+    first_name: Optional[constr(max_length=50)] = None
+    last_name: Optional[constr(max_length=50)] = None
+    birth_date: Optional[date] = None
+    phone: Optional[constr(max_length=20)] = None
+
+    @model_validator(mode="after")
+    def check_password(self):
+        if (self.password is None) == (self.password_hash is None):
+            raise ValueError("Exactly one of password or password_hash is required")
+        return self
+
+class ImportIssue(BaseModel):
+    line: int
+    username: Optional[str] = None
+    detail: str
+
+class ImportProgress(BaseModel):
+    processed: int = 0
+    inserted: int = 0
+    conflicts: int = 0
+    errors: int = 0
+    done: bool = False
+    conflict_samples: list[ImportIssue] = []
+    error_samples: list[ImportIssue] = []
@@ -0,0 +1,107 @@
+"""Профиль запуска user_service и прогрев перед приемом запросов.
+
+Отчет о времени этапов запуска (в духе python -X importtime):
+    python -m app.startup [--warmup]
+"""
+from contextlib import contextmanager
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Прогрев выполняется в lifespan: uvicorn не принимает запросы, пока он не закончится,
+# поэтому проверка готовности проходит уже с открытыми соединениями и загруженным bcrypt
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "false").lower() in ("1", "true", "yes")
+WARMUP_POOL_CONNECTIONS = int(os.getenv("WARMUP_POOL_CONNECTIONS", "5"))
+STARTUP_REPORT = os.getenv("STARTUP_REPORT", "false").lower() in ("1", "true", "yes")
+
+class StartupProfile:
+    """Длительность этапов запуска в порядке выполнения"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: list[tuple[str, float]] = []
+        self.total: float = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def finish(self):
+        """Фиксирует общее время запуска и публикует этапы в метриках"""
+        from .metrics import STARTUP_STAGE_SECONDS
+        self.total = time.perf_counter() - self.started_at
+        for name, seconds in self.stages:
+            STARTUP_STAGE_SECONDS.labels(name).set(seconds)
+        STARTUP_STAGE_SECONDS.labels("total").set(self.total)
+        if STARTUP_REPORT:
+            print(self.report(), file=sys.stderr)
+
+    def report(self) -> str:
+        lines = ["startup time: self [us] | stage"]
+        for name, seconds in self.stages:
+            lines.append(f"startup time: {seconds * 1e6:>9.0f} | {name}")
+        if self.total is not None:
+            lines.append(f"startup time: {self.total * 1e6:>9.0f} | total")
+        return "\n".join(lines)
+
+startup_profile = StartupProfile()
+
+def prime_pool(engine, connections: int):
+    """Открывает connections соединений одновременно, чтобы они остались в пуле"""
+    from sqlalchemy import text
+    opened = []
+    try:
+        for _ in range(max(connections, 1)):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+
+def warm_up():
+    """Загрузка отложенных модулей, создание engine, соединения с БД и backend bcrypt"""
+    from . import models
+    from .auth import get_pwd_context
+    with startup_profile.stage("warmup: jose, passlib"):
+        import jose.jwt  # noqa: F401
+        pwd_context = get_pwd_context()
+    with startup_profile.stage("warmup: engine"):
+        engine = models.get_engine()
+    with startup_profile.stage("warmup: db pool"):
+        prime_pool(engine, WARMUP_POOL_CONNECTIONS)
+        for replica in models.replica_engines:
+            # Недоступная реплика не мешает запуску: роутер переключит чтение на primary
+            try:
+                prime_pool(replica, WARMUP_POOL_CONNECTIONS)
+            except Exception:
+                pass
+    with startup_profile.stage("warmup: bcrypt backend"):
+        pwd_context.handler().get_backend()
+
+async def run_startup(app):
+    async with app.router.lifespan_context(app):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Print user_service startup stage timings")
+    parser.add_argument("--warmup", action="store_true", help="Also run the warm-up (needs the database)")
+    args = parser.parse_args()
+    if args.warmup:
+        os.environ["STARTUP_WARMUP"] = "true"
+
+    # Профиль этого модуля, запущенного как __main__, не используется: этапы пишет app.startup,
+    # который импортирует app.main
+    from .main import app
+    from .startup import startup_profile as profile
+    asyncio.run(run_startup(app))
+    print(profile.report())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Request
+import ipaddress
+import os
+import sqlite3
+import threading
+import time
+
+# Настройки ограничения попыток входа
+LOGIN_WINDOW_SECONDS = float(os.getenv("LOGIN_WINDOW_SECONDS", "900"))
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "5"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "50"))
+LOGIN_MAX_LOCKOUT_SECONDS = float(os.getenv("LOGIN_MAX_LOCKOUT_SECONDS", "900"))
+# Общий SQLite-файл для счетчиков всех воркеров; по умолчанию - память процесса
+LOGIN_THROTTLE_STORE_PATH = os.getenv("LOGIN_THROTTLE_STORE_PATH")
+# Адрес клиента из X-Forwarded-For (его передает gateway) берется только от доверенных прокси:
+# адреса или сети через запятую. TRUST_FORWARDED_FOR=true доверяет заголовку от любого адреса -
+# только если порт user_service недоступен никому, кроме gateway
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(item.strip(), strict=False)
+    for item in os.getenv("TRUSTED_PROXIES", "").split(",") if item.strip()
+]
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+class MemoryFailureStore:
+    """Времена неудачных попыток по ключам в памяти процесса с LRU-ограничением числа ключей"""
+
+    def __init__(self, max_keys: int = 100000, max_entries: int = 64):
+        self.max_keys = max_keys
+        self.max_entries = max_entries
+        self._failures: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def failures(self, key: str, since: float) -> tuple[int, float]:
+        """Число неудач после since и время последней"""
+        with self._lock:
+            times = self._failures.get(key)
+            if not times:
+                return 0, 0.0
+            recent = [t for t in times if t > since]
+            if len(recent) != len(times):
+                if recent:
+                    self._failures[key] = recent
+                else:
+                    del self._failures[key]
+            return len(recent), recent[-1] if recent else 0.0
+
+    def add(self, key: str, now: float):
+        with self._lock:
+            times = self._failures.setdefault(key, [])
+            times.append(now)
+            if len(times) > self.max_entries:
+                del times[0]
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def clear(self, key: str):
+        with self._lock:
+            self._failures.pop(key, None)
+
+class SQLiteFailureStore:
+    """Неудачные попытки в общем SQLite-файле, чтобы счетчики были общими для воркеров хоста"""
+
+    def __init__(self, path: str, retention_seconds: float, purge_interval: float = 60.0):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS login_failures (key TEXT NOT NULL, ts REAL NOT NULL)"
+        )
+        self._connection().execute(
+            "CREATE INDEX IF NOT EXISTS ix_login_failures_key_ts ON login_failures (key, ts)"
+        )
+        self._connection().execute(
+            "CREATE INDEX IF NOT EXISTS ix_login_failures_ts ON login_failures (ts)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def failures(self, key: str, since: float) -> tuple[int, float]:
+        count, last = self._connection().execute(
+            "SELECT COUNT(*), MAX(ts) FROM login_failures WHERE key = ? AND ts > ?", (key, since)
+        ).fetchone()
+        return count, last or 0.0
+
+    def add(self, key: str, now: float):
+        conn = self._connection()
+        conn.execute("INSERT INTO login_failures (key, ts) VALUES (?, ?)", (key, now))
+        conn.execute(
+            "DELETE FROM login_failures WHERE key = ? AND ts <= ?", (key, now - self.retention_seconds)
+        )
+        # Ключи, по которым больше не было неудач (перебор username, IP), удаляются общей
+        # очисткой не чаще раза в purge_interval, иначе файл растет без ограничений
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            conn.execute("DELETE FROM login_failures WHERE ts <= ?", (now - self.retention_seconds,))
+
+    def clear(self, key: str):
+        self._connection().execute("DELETE FROM login_failures WHERE key = ?", (key,))
+
+class LoginThrottle:
+    """Скользящее окно неудачных входов по username и IP.
+
+    После порога ключ блокируется на base_lockout * 2^(сверх порога) секунд (не больше
+    max_lockout); проверка выполняется до запроса в БД и bcrypt.
+    """
+
+    def __init__(
+        self,
+        store=None,
+        window_seconds: float = 900,
+        max_failures_per_user: int = 5,
+        max_failures_per_ip: int = 50,
+        base_lockout: float = 1.0,
+        max_lockout: float = 900,
+    ):
+        self.store = store or MemoryFailureStore()
+        self.window_seconds = window_seconds
+        self.max_failures_per_user = max_failures_per_user
+        self.max_failures_per_ip = max_failures_per_ip
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+
+    def _retry_after(self, key: str, threshold: int, now: float) -> float:
+        count, last = self.store.failures(key, now - self.window_seconds)
+        if count < threshold:
+            return 0.0
+        lockout = min(self.max_lockout, self.base_lockout * 2 ** min(count - threshold, 32))
+        return max(0.0, last + lockout - now)
+
+    def check(self, username: str, client_ip: Optional[str], now: Optional[float] = None) -> float:
+        """Сколько секунд ждать до следующей попытки (0 - попытка разрешена)"""
+        now = time.time() if now is None else now
+        retry_after = self._retry_after(f"user:{username.lower()}", self.max_failures_per_user, now)
+        if client_ip:
+            retry_after = max(retry_after, self._retry_after(f"ip:{client_ip}", self.max_failures_per_ip, now))
+        return retry_after
+
+    def record_failure(self, username: str, client_ip: Optional[str], now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self.store.add(f"user:{username.lower()}", now)
+        if client_ip:
+            self.store.add(f"ip:{client_ip}", now)
+
+    def record_success(self, username: str):
+        self.store.clear(f"user:{username.lower()}")
+
+def is_trusted_proxy(host: Optional[str]) -> bool:
+    if TRUST_FORWARDED_FOR:
+        return True
+    if not host or not TRUSTED_PROXIES:
+        return False
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+def get_client_ip(request: Request) -> Optional[str]:
+    """Адрес клиента с учетом X-Forwarded-For от доверенного прокси (gateway)"""
+    host = request.client.host if request.client else None
+    if is_trusted_proxy(host):
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return host
+
+login_throttle = LoginThrottle(
+    store=(
+        SQLiteFailureStore(LOGIN_THROTTLE_STORE_PATH, LOGIN_WINDOW_SECONDS)
+        if LOGIN_THROTTLE_STORE_PATH else MemoryFailureStore()
+    ),
+    window_seconds=LOGIN_WINDOW_SECONDS,
+    max_failures_per_user=LOGIN_MAX_FAILURES_PER_USER,
+    max_failures_per_ip=LOGIN_MAX_FAILURES_PER_IP,
+    max_lockout=LOGIN_MAX_LOCKOUT_SECONDS,
+)
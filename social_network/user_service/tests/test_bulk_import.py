@@ -0,0 +1,102 @@
+import json
+from fastapi.testclient import TestClient
+from app import auth
+from app.main import app
+from app.models import User
+from app.auth import get_password_hash, verify_password
+from app.bulk_import import import_users, get_import_pool
+from tests.test_handlers import TestingSessionLocal, engine
+
+client = TestClient(app)
+
+PASSWORD_HASH = get_password_hash("prehashed123")
+
+CSV_DATA = (
+    "username,email,password,password_hash,first_name\n"
+    f"alice,alice@example.com,,{PASSWORD_HASH},Alice\n"
+    "bob,bob@example.com,bobpassword1,,\n"
+    "carol,not-an-email,carolpassword,,\n"
+    "alice,alice2@example.com,alicepassword,,\n"
+    "existing,new@example.com,somepassword1,,\n"
+)
+
+def last(progress_iter):
+    progress = None
+    for progress in progress_iter:
+        pass
+    return progress
+
+class TestBulkImport:
+    """Тесты для массового импорта пользователей"""
+
+    def setup_method(self):
+        db = TestingSessionLocal()
+        db.query(User).delete()
+        db.add(User(username="existing", email="existing@example.com", password_hash=PASSWORD_HASH))
+        db.commit()
+        db.close()
+
+    def test_import_csv(self):
+        """Тест: импорт с предхешированными паролями, ошибками и конфликтами"""
+        report = last(import_users(CSV_DATA.splitlines(keepends=True), "csv", engine, workers=0))
+
+        assert report.done
+        assert report.processed == 5
+        assert report.inserted == 2
+        assert report.errors == 1
+        assert report.conflicts == 2
+        assert report.error_samples[0].line == 4
+        assert {issue.username for issue in report.conflict_samples} == {"alice", "existing"}
+
+        db = TestingSessionLocal()
+        alice = db.query(User).filter(User.username == "alice").one()
+        bob = db.query(User).filter(User.username == "bob").one()
+        db.close()
+        assert alice.password_hash == PASSWORD_HASH
+        assert alice.first_name == "Alice"
+        assert verify_password("bobpassword1", bob.password_hash)
+
+    def test_import_ndjson_batches(self):
+        """Тест: прогресс отдается после каждой пачки, пароли хешируются в пуле процессов"""
+        lines = [
+            json.dumps({"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": PASSWORD_HASH})
+            for i in range(5)
+        ]
+        lines.append(json.dumps({"username": "hashed", "email": "hashed@example.com", "password": "plainpassword"}))
+        lines.append("{broken")
+
+        reports = [
+            progress.model_copy()
+            for progress in import_users(lines, "ndjson", engine, batch_size=2, workers=2)
+        ]
+
+        assert [report.processed for report in reports] == [2, 4, 6, 7]
+        assert reports[-1].done and reports[-1].inserted == 6 and reports[-1].errors == 1
+
+    def test_import_endpoint(self, monkeypatch):
+        """Тест: эндпоинт требует ключ администратора и отдает прогресс потоком"""
+        monkeypatch.setattr(auth, "ADMIN_API_KEY", "admin-key")
+        body = "\n".join(
+            json.dumps({"username": f"api{i}", "email": f"api{i}@example.com", "password_hash": PASSWORD_HASH})
+            for i in range(3)
+        )
+
+        forbidden = client.post("/api/v1/admin/import", content=body)
+        response = client.post(
+            "/api/v1/admin/import",
+            params={"batch_size": 2},
+            content=body,
+            headers={"X-Admin-Key": "admin-key"}
+        )
+
+        assert forbidden.status_code == 403
+        assert response.status_code == 200
+        assert client.post(
+            "/api/v1/admin/import", params={"batch_size": 100000}, content=body, headers={"X-Admin-Key": "admin-key"}
+        ).status_code == 422
+        progress = [json.loads(line) for line in response.text.splitlines()]
+        assert progress[-1]["done"] is True
+        assert progress[-1]["inserted"] == 3
+        # Один пул на воркер сервиса, процессы запускаются через spawn
+        assert get_import_pool() is get_import_pool()
+        assert get_import_pool()._mp_context.get_start_method() == "spawn"
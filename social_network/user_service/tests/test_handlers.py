@@ -3,7 +3,7 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.models import Base, get_db, User
+from app.models import create_tables, get_db, get_read_db, User
 from app.auth import get_password_hash
 
 # Создаем тестовую базу данных в памяти
@@ -19,9 +19,10 @@ def override_get_db():
         db.close()
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 
 # Создаем таблицы для тестов
-Base.metadata.create_all(bind=engine)
+create_tables(engine)
 
 client = TestClient(app)
 
@@ -86,6 +87,23 @@ class TestUserRegistration:
         assert response2.status_code == 400
         assert "Email already exists" in response2.json()["detail"]
     
+    def test_register_duplicate_ignores_case(self):
+        """Тест: username и email, отличающиеся только регистром, считаются занятыми"""
+        user_data = {
+            "username": "testuser",
+            "password": "testpassword123",
+            "email": "test@example.com"
+        }
+        client.post("/api/v1/register", json=user_data)
+        
+        by_username = client.post("/api/v1/register", json={**user_data, "username": "TestUser", "email": "other@example.com"})
+        by_email = client.post("/api/v1/register", json={**user_data, "username": "other", "email": "Test@Example.com"})
+        
+        assert by_username.status_code == 400
+        assert "Username already exists" in by_username.json()["detail"]
+        assert by_email.status_code == 400
+        assert "Email already exists" in by_email.json()["detail"]
+    
     def test_register_user_invalid_data(self):
         """Тест регистрации с невалидными данными"""
         # Слишком короткий username
@@ -98,6 +116,16 @@ class TestUserRegistration:
         response = client.post("/api/v1/register", json=user_data)
         assert response.status_code == 422  # Validation error
         
+        # '@' в username: вход по такому идентификатору ищет email
+        user_data = {
+            "username": "test@user",
+            "password": "testpassword123",
+            "email": "test@example.com"
+        }
+        
+        response = client.post("/api/v1/register", json=user_data)
+        assert response.status_code == 422  # Validation error
+        
         # Слишком короткий пароль
         user_data = {
             "username": "testuser",
@@ -166,6 +194,14 @@ class TestUserLogin:
         assert "access_token" in data
         assert data["user"]["username"] == "testuser"
     
+    def test_login_ignores_case(self):
+        """Тест: регистр username и email при входе не важен"""
+        for identifier in ("TestUser", "TEST@example.COM"):
+            response = client.post("/api/v1/login", json={"username": identifier, "password": "testpassword123"})
+            
+            assert response.status_code == 200
+            assert response.json()["user"]["username"] == "testuser"
+    
     def test_login_wrong_password(self):
         """Тест аутентификации с неправильным паролем"""
         login_data = {
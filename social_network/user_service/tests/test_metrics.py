@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+from app import metrics
+from app.main import app
+from app.models import User
+from app.auth import get_password_hash
+from tests.test_handlers import TestingSessionLocal, engine
+
+metrics.instrument_engine(engine)
+
+client = TestClient(app)
+
+class TestMetrics:
+    """Тесты для эндпоинта /metrics"""
+
+    def setup_method(self):
+        db = TestingSessionLocal()
+        db.query(User).delete()
+        db.add(User(
+            username="metricsuser",
+            email="metrics@example.com",
+            password_hash=get_password_hash("testpassword123")
+        ))
+        db.commit()
+        db.close()
+
+    def test_route_and_stage_metrics(self):
+        """Тест: запросы учитываются по шаблону маршрута, bcrypt и SQL - отдельно"""
+        client.post("/api/v1/login", json={"username": "metricsuser", "password": "testpassword123"})
+        client.post("/api/v1/login", json={"username": "metricsuser", "password": "wrongpassword"})
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        body = response.text
+        assert 'http_requests_total{method="POST",route="/api/v1/login",status_class="2xx"}' in body
+        assert 'http_requests_total{method="POST",route="/api/v1/login",status_class="4xx"}' in body
+        assert 'http_request_duration_seconds_bucket{le="0.005",method="POST",route="/api/v1/login"}' in body
+        assert 'http_requests_in_flight{method="POST",route="/api/v1/login"} 0.0' in body
+        assert 'password_hash_duration_seconds_count{operation="verify"}' in body
+        assert "db_query_duration_seconds_count" in body
+
+    def test_unknown_path_not_labelled(self):
+        """Тест: неизвестные пути не создают отдельных меток"""
+        client.get("/no/such/path/12345")
+
+        body = client.get("/metrics").text
+
+        assert "/no/such/path/12345" not in body
+        assert 'route="unmatched"' in body
@@ -0,0 +1,66 @@
+import msgpack
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import User
+from app.auth import get_password_hash
+from app.protocol import MSGPACK
+from tests.test_handlers import TestingSessionLocal
+
+client = TestClient(app)
+
+class TestMsgPackProtocol:
+    """Тесты для внутреннего формата msgpack"""
+
+    def setup_method(self):
+        db = TestingSessionLocal()
+        db.query(User).delete()
+        db.add(User(
+            username="packuser",
+            email="pack@example.com",
+            password_hash=get_password_hash("testpassword123")
+        ))
+        db.commit()
+        db.close()
+
+    def test_login_msgpack(self):
+        """Тест: тело и ответ в msgpack при соответствующих заголовках"""
+        response = client.post(
+            "/api/v1/login",
+            content=msgpack.packb({"username": "packuser", "password": "testpassword123"}),
+            headers={"Content-Type": MSGPACK, "Accept": f"{MSGPACK}, application/json"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == MSGPACK
+        data = msgpack.unpackb(response.content)
+        assert data["token_type"] == "bearer"
+        assert data["user"]["username"] == "packuser"
+
+    def test_users_json_by_default(self):
+        """Тест: без Accept: msgpack ответ остается в JSON"""
+        response = client.get("/api/v1/users")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json()[0]["username"] == "packuser"
+
+    def test_errors_stay_json(self):
+        """Тест: ошибки возвращаются в JSON даже при Accept: msgpack"""
+        response = client.post(
+            "/api/v1/login",
+            content=msgpack.packb({"username": "packuser", "password": "wrongpassword"}),
+            headers={"Content-Type": MSGPACK, "Accept": MSGPACK}
+        )
+
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Incorrect username or password"
+
+    def test_malformed_msgpack(self):
+        """Тест: поврежденное тело отклоняется с 400"""
+        response = client.post(
+            "/api/v1/login",
+            content=b"\xc1",
+            headers={"Content-Type": MSGPACK}
+        )
+
+        assert response.status_code == 400
@@ -0,0 +1,143 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models import Base, User
+from app.replicas import (
+    ReplicaRouter, RecentWrites, RoutingSession, PrimaryUntilMiddleware, mark_primary_until, primary_until_active
+)
+
+def make_engine(url: str = "sqlite://"):
+    return create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+def seed(engine, username: str):
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(username=username, email=f"{username}@example.com", password_hash="x"))
+    db.commit()
+    db.close()
+
+def make_session(router: ReplicaRouter):
+    return sessionmaker(class_=RoutingSession, bind=router.primary, router=router)()
+
+class TestReplicaRouting:
+    """Тесты для маршрутизации чтения между primary и репликами"""
+
+    def setup_method(self):
+        self.primary = make_engine()
+        self.replica = make_engine()
+        seed(self.primary, "primary_user")
+        seed(self.replica, "replica_user")
+
+    def test_reads_go_to_replica(self):
+        """Тест: чтение по умолчанию выполняется на реплике"""
+        db = make_session(ReplicaRouter(self.primary, [self.replica]))
+
+        assert db.query(User).one().username == "replica_user"
+        db.close()
+
+    def test_use_primary(self):
+        """Тест: после use_primary() чтение идет в primary"""
+        db = make_session(ReplicaRouter(self.primary, [self.replica]))
+        db.use_primary()
+
+        assert db.query(User).one().username == "primary_user"
+        db.close()
+
+    def test_writes_go_to_primary(self):
+        """Тест: flush всегда выполняется на primary"""
+        db = make_session(ReplicaRouter(self.primary, [self.replica]))
+        db.add(User(username="new_user", email="new@example.com", password_hash="x"))
+        db.commit()
+        db.close()
+
+        primary_db = sessionmaker(bind=self.primary)()
+        assert primary_db.query(User).filter(User.username == "new_user").count() == 1
+        primary_db.close()
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        """Тест: недоступная реплика исключается, чтение повторяется на primary"""
+        broken = create_engine("sqlite:////nonexistent-dir/replica.db")
+        router = ReplicaRouter(self.primary, [broken], retry_seconds=60)
+        db = make_session(router)
+
+        assert db.query(User).one().username == "primary_user"
+        assert not router.is_healthy(broken)
+        assert router.choose() is self.primary
+        db.close()
+
+    def test_query_error_keeps_replica(self):
+        """Тест: ошибка самого запроса (не соединения) не исключает реплику"""
+        router = ReplicaRouter(self.primary, [self.replica], retry_seconds=60)
+        db = make_session(router)
+
+        with pytest.raises(OperationalError):
+            db.execute(text("SELECT * FROM missing_table"))
+        assert router.is_healthy(self.replica)
+        db.close()
+
+    def test_no_replicas(self):
+        """Тест: без реплик все запросы идут в primary"""
+        db = make_session(ReplicaRouter(self.primary, []))
+
+        assert db.query(User).one().username == "primary_user"
+        db.close()
+
+class TestRecentWrites:
+    """Тесты для окна привязки к primary"""
+
+    def test_window_expires(self):
+        """Тест: ключ привязан к primary только в пределах окна"""
+        recent = RecentWrites(window_seconds=0)
+        recent.mark("user")
+
+        assert not recent.is_recent("user")
+
+    def test_bounded(self):
+        """Тест: число отслеживаемых ключей ограничено"""
+        recent = RecentWrites(window_seconds=60, max_keys=2)
+        recent.mark("a", "b", "c")
+
+        assert not recent.is_recent("a")
+        assert recent.is_recent("b") and recent.is_recent("c")
+
+class TestPrimaryUntil:
+    """Тесты для отметки X-Primary-Until, общей для всех воркеров"""
+
+    def setup_method(self):
+        app = FastAPI()
+        app.add_middleware(PrimaryUntilMiddleware)
+
+        @app.post("/write")
+        async def write():
+            mark_primary_until(5)
+            return {}
+
+        @app.get("/read")
+        async def read():
+            return {"primary": primary_until_active()}
+
+        self.client = TestClient(app)
+
+    def test_write_sets_marker(self):
+        """Тест: ответ на запись несет время, до которого чтения идут в primary"""
+        response = self.client.post("/write")
+
+        assert float(response.headers["x-primary-until"]) > time.time()
+        assert "x-primary-until" not in self.client.get("/read").headers
+
+    def test_marker_routes_reads_to_primary(self):
+        """Тест: чтение с действующей отметкой идет в primary, с истекшей или неверной - нет"""
+        assert self.client.get("/read", headers={"X-Primary-Until": str(time.time() + 5)}).json()["primary"]
+        assert not self.client.get("/read", headers={"X-Primary-Until": str(time.time() - 1)}).json()["primary"]
+        assert not self.client.get("/read", headers={"X-Primary-Until": "soon"}).json()["primary"]
+
+    def test_marker_is_capped(self):
+        """Тест: отметка клиента дальше now + окно обрезается и не продлевается в ответе"""
+        response = self.client.post("/write", headers={"X-Primary-Until": "99999999999"})
+
+        assert float(response.headers["x-primary-until"]) <= time.time() + 5
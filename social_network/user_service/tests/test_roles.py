@@ -0,0 +1,133 @@
+from fastapi.testclient import TestClient
+from jose import jwt
+from app.main import app
+from app.models import User, UserRole
+from app.auth import get_password_hash, create_access_token, SECRET_KEY, ALGORITHM
+from app import roles
+from app.roles import RoleVersionCache, role_versions, set_user_roles
+from tests.test_handlers import TestingSessionLocal
+
+client = TestClient(app)
+
+PASSWORD_HASH = get_password_hash("password123")
+
+def login(username: str) -> str:
+    response = client.post("/api/v1/login", json={"username": username, "password": "password123"})
+    return response.json()["access_token"]
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+class TestRoleVersionCache:
+    """Тесты для кэша версий ролей"""
+
+    def test_loads_once_within_ttl(self):
+        """Тест: повторные проверки не обращаются к БД до истечения TTL"""
+        cache = RoleVersionCache(ttl_seconds=60)
+        loads = []
+
+        def load():
+            loads.append(1)
+            return 3
+
+        assert cache.get(1, load) == 3
+        assert cache.get(1, load) == 3
+        assert len(loads) == 1
+
+    def test_bounded(self):
+        """Тест: число пользователей в кэше ограничено"""
+        cache = RoleVersionCache(ttl_seconds=60, max_keys=2)
+        for user_id in range(3):
+            cache.set(user_id, 0)
+
+        assert cache.get(0, lambda: 7) == 7
+        assert cache.get(2, lambda: 7) == 0
+
+class TestRoles:
+    """Тесты для ролей и проверки прав по токену"""
+
+    def setup_method(self):
+        role_versions.clear()
+        db = TestingSessionLocal()
+        db.query(UserRole).delete()
+        db.query(User).delete()
+        db.add(User(username="admin", email="admin@example.com", password_hash=PASSWORD_HASH))
+        db.add(User(username="member", email="member@example.com", password_hash=PASSWORD_HASH))
+        db.commit()
+        admin = db.query(User).filter(User.username == "admin").one()
+        set_user_roles(db, admin, ["admin"])
+        db.close()
+        role_versions.clear()
+
+    def teardown_method(self):
+        role_versions.clear()
+
+    def test_token_contains_compact_role_claims(self):
+        """Тест: роли и их версия записываются в токен при входе"""
+        claims = jwt.decode(login("admin"), SECRET_KEY, algorithms=[ALGORITHM])
+        member_claims = jwt.decode(login("member"), SECRET_KEY, algorithms=[ALGORITHM])
+
+        assert claims["roles"] == ["admin"]
+        assert claims["rv"] == 1
+        assert "roles" not in member_claims
+        assert member_claims["rv"] == 0
+
+    def test_permission_required(self):
+        """Тест: управление ролями доступно только с правом roles:manage"""
+        response = client.put(
+            "/api/v1/admin/users/admin/roles", json={"roles": []}, headers=auth(login("member"))
+        )
+        unknown = client.put(
+            "/api/v1/admin/users/member/roles", json={"roles": ["root"]}, headers=auth(login("admin"))
+        )
+
+        assert response.status_code == 403
+        assert unknown.status_code == 400
+
+    def test_role_change_revokes_old_tokens(self):
+        """Тест: после изменения ролей старые токены отклоняются, новые содержат новые роли"""
+        admin_token = login("admin")
+        member_token = login("member")
+
+        response = client.put(
+            "/api/v1/admin/users/member/roles", json={"roles": ["admin"]}, headers=auth(admin_token)
+        )
+        old = client.get("/api/v1/profile", headers=auth(member_token))
+        new_token = login("member")
+        promoted = client.put(
+            "/api/v1/admin/users/admin/roles", json={"roles": ["admin"]}, headers=auth(new_token)
+        )
+
+        assert response.status_code == 200
+        assert response.json()["roles"] == ["admin"]
+        assert response.json()["roles_version"] == 1
+        assert old.status_code == 401
+        assert old.json()["detail"] == "Token roles are outdated"
+        assert promoted.status_code == 200
+
+    def test_cached_version_avoids_db(self, monkeypatch):
+        """Тест: проверка прав берет версию ролей из кэша, а не из БД"""
+        token = login("member")
+        assert client.get("/api/v1/profile", headers=auth(token)).status_code == 200
+
+        def fail(db, user_id):
+            raise AssertionError("role version read from DB")
+
+        monkeypatch.setattr(roles, "load_role_version", fail)
+        assert client.get("/api/v1/profile", headers=auth(token)).status_code == 200
+
+    def test_legacy_token_without_roles(self):
+        """Тест: токены без claims ролей действуют с ролью user"""
+        token = create_access_token(data={"sub": "member"})
+
+        assert client.get("/api/v1/profile", headers=auth(token)).status_code == 200
+        assert client.put(
+            "/api/v1/admin/users/member/roles", json={"roles": []}, headers=auth(token)
+        ).status_code == 403
+
+    def test_role_version_endpoint(self):
+        """Тест: gateway получает текущую версию ролей по токену пользователя"""
+        response = client.get("/api/v1/roles/version", headers=auth(login("admin")))
+
+        assert response.status_code == 200
+        assert response.json()["roles_version"] == 1
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+from app import metrics
+from app.startup import StartupProfile
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def run_python(*args, env=None):
+    return subprocess.run(
+        [sys.executable, *args], cwd=SERVICE_DIR, env={**os.environ, **(env or {})},
+        check=True, capture_output=True, text=True
+    ).stdout
+
+class TestStartup:
+    """Тесты для отложенной инициализации и профиля запуска"""
+
+    def test_import_defers_engine_and_heavy_modules(self):
+        """Тест: импорт приложения не создает engine и не загружает jose, passlib и драйвер БД"""
+        output = run_python("-c", (
+            "import sys, app.main, app.models\n"
+            "print(app.models.engine is None, [m for m in ('jose', 'passlib', 'psycopg2') if m in sys.modules])"
+        ))
+
+        assert output.strip() == "True []"
+
+    def test_warmup_report(self, tmp_path):
+        """Тест: прогрев открывает соединения и загружает bcrypt, отчет содержит все этапы"""
+        output = run_python("-m", "app.startup", "--warmup", env={"DATABASE_URL": f"sqlite:///{tmp_path}/users.db"})
+
+        stages = [line.split("|")[1].strip() for line in output.splitlines()[1:]]
+        assert stages == [
+            "import fastapi", "import app.models (sqlalchemy)", "import app.schemas (pydantic)",
+            "import app.handlers", "create app", "warmup: jose, passlib", "warmup: engine",
+            "warmup: db pool", "warmup: bcrypt backend", "total",
+        ]
+
+    def test_stages_published_as_metrics(self):
+        """Тест: длительности этапов доступны в /metrics"""
+        profile = StartupProfile()
+        with profile.stage("import test"):
+            pass
+        profile.finish()
+
+        assert metrics.STARTUP_STAGE_SECONDS.labels("import test")._value.get() >= 0
+        assert profile.report().splitlines()[-1].endswith("| total")
@@ -0,0 +1,148 @@
+import ipaddress
+import pytest
+from fastapi.testclient import TestClient
+from app import handlers, throttling
+from app.main import app
+from app.models import User
+from app.auth import get_password_hash
+from app.throttling import LoginThrottle, MemoryFailureStore, SQLiteFailureStore
+from tests.test_handlers import TestingSessionLocal
+
+client = TestClient(app)
+
+class TestLoginThrottle:
+    """Тесты для ограничения неудачных попыток входа"""
+
+    def test_progressive_lockout(self):
+        """Тест: после порога блокировка растет вдвое с каждой неудачей"""
+        throttle = LoginThrottle(max_failures_per_user=3, base_lockout=1.0, max_lockout=4.0)
+        for i in range(3):
+            assert throttle.check("Alice", "10.0.0.1", now=100.0 + i) == 0
+            throttle.record_failure("Alice", "10.0.0.1", now=100.0 + i)
+
+        assert throttle.check("alice", "10.0.0.2", now=102.5) == pytest.approx(0.5)
+        throttle.record_failure("alice", None, now=103.0)
+        assert throttle.check("alice", None, now=103.0) == pytest.approx(2.0)
+        for _ in range(5):
+            throttle.record_failure("alice", None, now=104.0)
+        assert throttle.check("alice", None, now=104.0) == pytest.approx(4.0)
+
+    def test_window_and_success_reset(self):
+        """Тест: старые неудачи выпадают из окна, успешный вход сбрасывает счетчик"""
+        throttle = LoginThrottle(window_seconds=60, max_failures_per_user=2)
+        throttle.record_failure("bob", None, now=0.0)
+        throttle.record_failure("bob", None, now=1.0)
+
+        assert throttle.check("bob", None, now=1.5) > 0
+        assert throttle.check("bob", None, now=120.0) == 0
+
+        throttle.record_failure("bob", None, now=200.0)
+        throttle.record_failure("bob", None, now=201.0)
+        throttle.record_success("bob")
+        assert throttle.check("bob", None, now=201.0) == 0
+
+    def test_ip_limit(self):
+        """Тест: перебор разных username с одного адреса блокируется по IP"""
+        throttle = LoginThrottle(max_failures_per_user=100, max_failures_per_ip=3)
+        for i in range(3):
+            throttle.record_failure(f"user{i}", "10.0.0.1", now=10.0)
+
+        assert throttle.check("someone", "10.0.0.1", now=10.0) > 0
+        assert throttle.check("someone", "10.0.0.2", now=10.0) == 0
+
+    def test_memory_store_is_bounded(self):
+        """Тест: число ключей и записей на ключ ограничено"""
+        store = MemoryFailureStore(max_keys=2, max_entries=3)
+        for key in ("a", "b", "c"):
+            store.add(key, 1.0)
+        for i in range(5):
+            store.add("c", 2.0 + i)
+
+        assert store.failures("a", 0.0) == (0, 0.0)
+        assert store.failures("c", 0.0) == (3, 6.0)
+
+    def test_sqlite_store_is_shared(self, tmp_path):
+        """Тест: счетчики в SQLite видны всем экземплярам (воркерам)"""
+        path = str(tmp_path / "throttle.db")
+        first = LoginThrottle(store=SQLiteFailureStore(path, 60), max_failures_per_user=2)
+        second = LoginThrottle(store=SQLiteFailureStore(path, 60), max_failures_per_user=2)
+        first.record_failure("carol", None, now=10.0)
+        second.record_failure("carol", None, now=11.0)
+
+        assert first.check("carol", None, now=11.0) > 0
+        second.record_success("carol")
+        assert first.check("carol", None, now=11.0) == 0
+
+    def test_sqlite_store_purges_stale_keys(self, tmp_path):
+        """Тест: записи ключей без новых неудач удаляются общей очисткой"""
+        store = SQLiteFailureStore(str(tmp_path / "throttle.db"), 60, purge_interval=30)
+        for i in range(5):
+            store.add(f"user:guess{i}", now=10.0)
+        store.add("user:other", now=50.0)
+        assert store._connection().execute("SELECT COUNT(*) FROM login_failures").fetchone()[0] == 6
+
+        store.add("user:other", now=100.0)
+        assert store._connection().execute("SELECT COUNT(*) FROM login_failures").fetchone()[0] == 2
+
+class TestLoginEndpointThrottling:
+    """Тесты для ограничения попыток входа в эндпоинте /login"""
+
+    def setup_method(self):
+        db = TestingSessionLocal()
+        db.query(User).delete()
+        db.add(User(username="dave", email="dave@example.com", password_hash=get_password_hash("davepassword")))
+        db.commit()
+        db.close()
+
+    def test_locked_login_skips_bcrypt(self, monkeypatch):
+        """Тест: заблокированный вход получает 429 без запроса в БД и проверки пароля"""
+        monkeypatch.setattr(handlers, "login_throttle", LoginThrottle(max_failures_per_user=2, base_lockout=60))
+        verified = []
+        monkeypatch.setattr(handlers, "verify_password", lambda *args: verified.append(args) or False)
+
+        for _ in range(2):
+            response = client.post("/api/v1/login", json={"username": "dave", "password": "wrong"})
+            assert response.status_code == 401
+        response = client.post("/api/v1/login", json={"username": "dave", "password": "davepassword"})
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "60"
+        assert len(verified) == 2
+
+    def test_forwarded_client_address(self, monkeypatch):
+        """Тест: адрес клиента берется из X-Forwarded-For от gateway"""
+        monkeypatch.setattr(throttling, "TRUST_FORWARDED_FOR", True)
+        throttle = LoginThrottle(max_failures_per_user=100, max_failures_per_ip=1, base_lockout=60)
+        monkeypatch.setattr(handlers, "login_throttle", throttle)
+
+        client.post(
+            "/api/v1/login",
+            json={"username": "dave", "password": "wrong"},
+            headers={"X-Forwarded-For": "203.0.113.7"}
+        )
+        blocked = client.post(
+            "/api/v1/login",
+            json={"username": "dave", "password": "davepassword"},
+            headers={"X-Forwarded-For": "203.0.113.7"}
+        )
+        allowed = client.post(
+            "/api/v1/login",
+            json={"username": "dave", "password": "davepassword"},
+            headers={"X-Forwarded-For": "198.51.100.1"}
+        )
+
+        assert blocked.status_code == 429
+        assert allowed.status_code == 200
+
+    def test_forwarded_for_only_from_trusted_proxies(self, monkeypatch):
+        """Тест: по умолчанию X-Forwarded-For игнорируется, с TRUSTED_PROXIES - только от этих адресов"""
+        class FakeRequest:
+            def __init__(self, host):
+                self.client = type("Client", (), {"host": host})()
+                self.headers = {"x-forwarded-for": "203.0.113.7"}
+
+        assert throttling.get_client_ip(FakeRequest("10.0.0.5")) == "10.0.0.5"
+        monkeypatch.setattr(throttling, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/24")])
+        assert throttling.get_client_ip(FakeRequest("10.0.0.5")) == "203.0.113.7"
+        assert throttling.get_client_ip(FakeRequest("192.0.2.1")) == "192.0.2.1"
+        assert throttling.get_client_ip(FakeRequest("testclient")) == "testclient"
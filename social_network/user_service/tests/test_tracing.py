@@ -0,0 +1,155 @@
+import json
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from app import tracing
+from app.main import app
+from app.models import User
+from app.auth import get_password_hash
+from app.protocol import NegotiatedResponse
+from tests.test_handlers import TestingSessionLocal, engine
+
+tracing.instrument_engine(engine)
+
+client = TestClient(app)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+class TestTraceparent:
+    """Тесты для разбора заголовка traceparent"""
+
+    def test_parse_valid(self):
+        """Тест разбора корректного заголовка"""
+        assert tracing.parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+        assert tracing.parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00") == (TRACE_ID, PARENT_ID, False)
+
+    def test_parse_invalid(self):
+        """Тест отбрасывания некорректных заголовков"""
+        assert tracing.parse_traceparent(None) is None
+        assert tracing.parse_traceparent("garbage") is None
+        assert tracing.parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+
+    def test_start_span_without_trace(self):
+        """Тест: без активного трейса span не создается"""
+        with tracing.start_span("noop") as span:
+            assert span is None
+
+class TestTracingMiddleware:
+    """Тесты для сквозной трассировки запросов"""
+
+    def setup_method(self):
+        db = TestingSessionLocal()
+        db.query(User).delete()
+        db.add(User(
+            username="traceuser",
+            email="trace@example.com",
+            password_hash=get_password_hash("testpassword123")
+        ))
+        db.commit()
+        db.close()
+
+    def test_login_spans_exported(self, tmp_path, monkeypatch):
+        """Тест: login под сэмплированным traceparent дает span'ы всех стадий"""
+        export_file = tmp_path / "spans.jsonl"
+        monkeypatch.setattr(tracing, "TRACE_EXPORT_FILE", str(export_file))
+
+        response = client.post(
+            "/api/v1/login",
+            json={"username": "traceuser", "password": "testpassword123"},
+            headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+        )
+
+        tracing.span_exporter.flush()
+        assert response.status_code == 200
+        assert response.headers["traceresponse"].startswith(f"00-{TRACE_ID}-")
+        spans = [json.loads(line) for line in export_file.read_text().splitlines()]
+        names = {span["name"] for span in spans}
+        assert {"POST /api/v1/login", "db.query", "password.verify", "jwt.encode", "serialize"} <= names
+        assert all(span["traceId"] == TRACE_ID for span in spans)
+        root = next(span for span in spans if span["name"] == "POST /api/v1/login")
+        assert root["parentSpanId"] == PARENT_ID
+
+    def test_unsampled_exports_nothing(self, tmp_path, monkeypatch):
+        """Тест: без сэмплирования span'ы не записываются"""
+        export_file = tmp_path / "spans.jsonl"
+        monkeypatch.setattr(tracing, "TRACE_EXPORT_FILE", str(export_file))
+
+        response = client.post(
+            "/api/v1/login",
+            json={"username": "traceuser", "password": "testpassword123"},
+            headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"}
+        )
+        client.get("/")
+        tracing.span_exporter.flush()
+
+        assert response.status_code == 200
+        assert not export_file.exists()
+
+    def test_serialize_span_covers_rendering(self, tmp_path, monkeypatch):
+        """Тест: span serialize закрывается после рендеринга ответа"""
+        rendered = []
+        original_render = NegotiatedResponse.render
+
+        def render(self, content):
+            span = tracing.current_span()
+            rendered.append(span.name if span else None)
+            return original_render(self, content)
+
+        monkeypatch.setattr(tracing, "TRACE_EXPORT_FILE", str(tmp_path / "spans.jsonl"))
+        monkeypatch.setattr(NegotiatedResponse, "render", render)
+        response = client.post(
+            "/api/v1/login",
+            json={"username": "traceuser", "password": "testpassword123"},
+            headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+        )
+        tracing.span_exporter.flush()
+
+        assert response.status_code == 200
+        assert rendered == ["serialize"]
+
+    def test_read_endpoints_have_serialize_span(self, tmp_path, monkeypatch):
+        """Тест: ответы /profile и /users тоже сериализуются внутри span serialize"""
+        export_file = tmp_path / "spans.jsonl"
+        monkeypatch.setattr(tracing, "TRACE_EXPORT_FILE", str(export_file))
+        token = client.post(
+            "/api/v1/login", json={"username": "traceuser", "password": "testpassword123"}
+        ).json()["access_token"]
+        traceparent = f"00-{TRACE_ID}-{PARENT_ID}-01"
+
+        profile = client.get(
+            "/api/v1/profile", headers={"Authorization": f"Bearer {token}", "traceparent": traceparent}
+        )
+        users = client.get("/api/v1/users", headers={"traceparent": traceparent})
+        tracing.span_exporter.flush()
+
+        assert profile.json()["username"] == "traceuser"
+        assert [user["username"] for user in users.json()] == ["traceuser"]
+        spans = [json.loads(line) for line in export_file.read_text().splitlines()]
+        roots = {span["spanId"]: span["name"] for span in spans if span["parentSpanId"] == PARENT_ID}
+        serialized = {roots.get(span["parentSpanId"]) for span in spans if span["name"] == "serialize"}
+        assert {"GET /api/v1/profile", "GET /api/v1/users"} <= serialized
+
+class TestSpanExporter:
+    """Тесты для фоновой записи span'ов"""
+
+    def test_background_write_and_overflow(self):
+        """Тест: запись идет в фоновом потоке, пока диск занят - очередь ограничена"""
+        exporter = tracing.SpanExporter(max_queue=1)
+        writing, release, written = threading.Event(), threading.Event(), []
+
+        def slow_write(lines):
+            writing.set()
+            release.wait(5)
+            written.extend(json.loads(line)["name"] for line in lines.splitlines())
+
+        exporter._write = slow_write
+        exporter.submit({"name": "first"})
+        writing.wait(5)
+        exporter.submit({"name": "second"})
+        exporter.submit({"name": "third"})
+        release.set()
+        exporter.flush()
+
+        assert exporter.dropped == 1
+        assert written == ["first", "second"]